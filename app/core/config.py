@@ -21,9 +21,63 @@ class Settings(BaseSettings):
     AZURE_SPEECH_KEY: Optional[str] = None
     AZURE_SPEECH_REGION: Optional[str] = None
 
+    # Media stream calls (STT_PROVIDER google/azure): the caller's audio is forked to /ws and transcribed live
+    STREAM_PARTIAL_HOLD: float = 0.4 # seconds an interim transcript must stay unchanged before it is acted on
+    STREAM_END_SILENCE_MS: int = 300 # quiet after speech that ends the wait above early (VAD)
+    STREAM_NO_INPUT_TIMEOUT: int = 8 # seconds after a prompt with no answer before it counts as silence
+    STREAM_CHUNK_MS: int = 100 # audio per recognizer request (Twilio sends 20 ms frames); 100-200 is the useful range
+    STREAM_REORDER_WINDOW: int = 5 # frames to wait for a missing one before filling it with silence
+
     # OpenAI
     OPENAI_API_KEY: Optional[str] = None
+
+    # Menu matching: local fuzzy matches at or above this confidence skip the LLM
+    LOCAL_MATCH_THRESHOLD: float = 0.8
+    # LLM match results are cached per (restaurant, menu version, utterance)
+    MATCH_CACHE_SIZE: int = 10000
+    MATCH_CACHE_TTL: int = 3600 # seconds
+    # If > 0, send the LLM only this many locally pre-ranked candidates instead of the full menu.
+    # Fewer input tokens, but the prompt is no longer a stable prefix for provider-side caching.
+    MATCH_PROMPT_CANDIDATES: int = 0
     
+    # Recording downloads (Twilio can return 404 for a moment until a recording is ready)
+    DOWNLOAD_CONNECT_TIMEOUT: float = 3.0
+    DOWNLOAD_READ_TIMEOUT: float = 10.0
+    DOWNLOAD_RETRIES: int = 3
+    DOWNLOAD_RETRY_BACKOFF: float = 0.25 # seconds, doubled on each retry
+    DOWNLOAD_MAX_CONNECTIONS: int = 20
+    # Recordings are kept in memory. If > 0, ones larger than this many bytes spill to a temp file.
+    AUDIO_SPOOL_MAX_BYTES: int = 0
+    # Voice activity detection: recordings are trimmed to their speech before upload, and ones with
+    # no speech skip transcription (the turn is handled as silence)
+    VAD_ENABLED: bool = True
+    VAD_MIN_DBFS: float = -45.0 # quietest level that can count as speech
+    VAD_MIN_SPEECH_MS: int = 150 # less speech than this in a clip counts as none
+    VAD_PAD_MS: int = 250 # kept on each side of the speech
+    # Recorded turns: Twilio's SpeechResult is used at once if it already answers the question.
+    # Otherwise each of these models transcribes the recording and the first usable transcript wins.
+    TRANSCRIBE_MODELS: str = "whisper-1" # comma-separated OpenAI transcription models
+    HEDGE_DEADLINE: float = 3.0 # seconds to wait before taking the best transcript so far
+    HEDGE_DEFAULT_CONFIDENCE: float = 0.7 # for transcripts that come without a confidence score
+
+    # Call session storage: "memory" (single worker only), "sqlite" or "redis"
+    SESSION_STORE: str = "memory"
+    SESSION_SQLITE_PATH: str = "data/sessions.db"
+    REDIS_URL: str = "redis://localhost:6379/0"
+    SESSION_TTL: int = 1800 # seconds without a webhook before a call's state is dropped
+    SESSION_TERMINAL_TTL: int = 60 # completed/hung-up calls, kept briefly for late callbacks
+    SESSION_MAX_LIVE: int = 50000 # in-memory backend: least recently used calls beyond this are dropped
+    SESSION_REAP_INTERVAL: int = 30 # seconds between expiry sweeps
+
+    # Confirmed orders: "sqlite" (orders/orders.db), "log" (orders/orders.log, JSON lines) or "json" (legacy file per order)
+    ORDER_STORE: str = "sqlite"
+    ORDER_DIR: str = "orders"
+    ORDER_FLUSH_INTERVAL: float = 0.05 # seconds the writer waits to group more orders into one commit
+    ORDER_BATCH_SIZE: int = 500
+    # Columnar copy of the order history for /api/reports (rebuilt from the order store if deleted)
+    ANALYTICS_DIR: str = "orders/analytics"
+    ANALYTICS_SYNC_BATCH: int = 10000 # orders pulled from the order store per step
+
     # Server Host (for Twilio callbacks)
     SERVER_HOST: str = "https://quantumca.org"
 
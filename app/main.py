@@ -1,7 +1,11 @@
-from fastapi import FastAPI, Request, WebSocket, Form, Response, Depends
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi import FastAPI, Request, WebSocket, Form, Response, Depends, HTTPException, Query
+from fastapi.responses import HTMLResponse, FileResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 import os
+import asyncio
+import datetime
+from typing import Optional
 from .core.config import settings
 from .services.stt import get_stt_provider
 from .models.database import get_restaurant_by_phone, Restaurant
@@ -13,8 +17,22 @@ app = FastAPI(title=settings.PROJECT_NAME)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize Flow Manager
-flow_manager = FlowManager()
+# Initialize Flow Manager; streaming providers take speech over /ws instead of <Gather>
+stt_provider = get_stt_provider()
+flow_manager = FlowManager(streaming=stt_provider.streaming)
+
+@app.on_event("startup")
+def build_prompts():
+    # Render every menu's item prompts up front rather than on the first call that needs them
+    from .models.database import tenant_registry
+    from .services.twiml import get_menu_prompts
+    for restaurant in tenant_registry.restaurants():
+        get_menu_prompts(restaurant)
+
+@app.on_event("shutdown")
+def flush_orders():
+    # Drain the order writer so confirmed orders are on disk before the process exits
+    flow_manager.orders.close()
 
 # Mount static files
 static_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static")
@@ -33,6 +51,104 @@ async def root():
 async def status():
     return {"status": "online", "message": "Restaurant AI Call Center is running"}
 
+@app.get("/api/metrics")
+async def metrics():
+    from .services.menu_matcher import matcher
+    from .services.transcriber import transcriber
+    from .services.media_stream import turn_latency
+    from .services.hedging import hedge
+    # Store stats can query SQLite or Redis; keep them off the event loop
+    sessions = await run_in_threadpool(flow_manager.store.stats)
+    orders = await run_in_threadpool(flow_manager.orders.stats)
+    return {
+        "menu_match_cache": matcher.cache.stats(),
+        "recording_download_seconds": transcriber.download_latency.snapshot(),
+        "recording_vad": transcriber.vad_stats,
+        "transcription_hedge": hedge.stats(),
+        "sessions": sessions,
+        "orders": orders,
+        "stream_turn_seconds": turn_latency.snapshot(),
+    }
+
+def _epoch(value: Optional[datetime.datetime]) -> Optional[float]:
+    return value.timestamp() if value is not None else None
+
+@app.get("/api/orders")
+async def list_orders(
+    restaurant_id: Optional[str] = None,
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+):
+    """
+    Orders newest first, one page at a time. Pass back `next_cursor` as `cursor` for the next page.
+    """
+    try:
+        orders, next_cursor = await run_in_threadpool(
+            flow_manager.orders.query, restaurant_id, _epoch(since), _epoch(until), cursor, limit
+        )
+    except NotImplementedError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"orders": orders, "next_cursor": next_cursor}
+
+@app.get("/api/orders/stream")
+async def stream_orders(
+    restaurant_id: Optional[str] = None,
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None,
+):
+    """
+    Every matching order as newline-delimited JSON, for exports too large for one page.
+    """
+    try:
+        rows = flow_manager.orders.stream(restaurant_id, _epoch(since), _epoch(until))
+        first = await run_in_threadpool(next, rows, None)
+    except NotImplementedError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
+    def lines():
+        if first is None:
+            return
+        yield first + "\n"
+        for row in rows:
+            yield row + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@app.get("/api/orders/{call_sid}")
+async def get_order(call_sid: str):
+    try:
+        order = await run_in_threadpool(flow_manager.orders.get, call_sid)
+    except NotImplementedError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    if order is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return order
+
+@app.get("/api/reports/orders")
+async def order_report(
+    restaurant_id: Optional[str] = None,
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None,
+    top: int = Query(5, ge=1, le=50),
+):
+    """
+    Revenue, basket size, hourly item popularity and option mix, all tenants unless restaurant_id is given.
+    """
+    from .services.analytics import analytics
+
+    def build():
+        analytics.sync(flow_manager.orders)
+        return analytics.report(restaurant_id, _epoch(since), _epoch(until), top)
+
+    try:
+        return await run_in_threadpool(build)
+    except NotImplementedError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
 @app.post("/voice")
 async def voice_entry(request: Request, CallSid: str = Form(...), To: str = Form(...)):
     """
@@ -54,7 +170,10 @@ async def voice_entry(request: Request, CallSid: str = Form(...), To: str = Form
         callback_url = f"{scheme}://{host}/voice/input"
         logger.info(f"Entry Callback: {callback_url}")
         
-        twiml = flow_manager.start_call(CallSid, restaurant, callback_url)
+        twiml = await run_in_threadpool(flow_manager.start_call, CallSid, restaurant, callback_url)
+        if flow_manager.streaming:
+            from .services.twiml import start_stream
+            twiml = start_stream(twiml, f"wss://{host}/ws", {"To": To, "callback": callback_url})
         return Response(content=twiml, media_type="application/xml")
     except Exception as e:
         import traceback
@@ -62,52 +181,93 @@ async def voice_entry(request: Request, CallSid: str = Form(...), To: str = Form
         logger.error(traceback.format_exc())
         return Response(content="<Response><Say>An application error occurred.</Say></Response>", media_type="application/xml")
 
+async def _transcribe_recording(call_sid: str, restaurant: Restaurant, url: str, speech_result: Optional[str], confidence: Optional[float]):
+    """
+    Twilio's SpeechResult if it already answers the question; otherwise a race between it and the
+    TRANSCRIBE_MODELS transcribing the recording (see TranscriptionHedge).
+    """
+    from .services.transcriber import transcriber
+    from .services.hedging import hedge, Candidate
+
+    fast = Candidate("twilio", speech_result, confidence) if speech_result else None
+    racers = {}
+    # One download (and VAD pass) shared by all the models
+    clip: Optional[asyncio.Future] = None
+    if transcriber.client:
+        async def load():
+            nonlocal clip
+            if clip is None:
+                clip = asyncio.ensure_future(transcriber.recording_clip(url))
+            return await asyncio.shield(clip)
+
+        def racer(model: str):
+            async def run():
+                data = await load()
+                if data is None:
+                    raise RuntimeError("recording could not be downloaded")
+                if not data:
+                    return Candidate(model, "", no_speech=True)
+                return Candidate(model, await transcriber.transcribe_clip(data, model=model))
+            return run
+
+        racers = {model: racer(model) for model in filter(None, map(str.strip, settings.TRANSCRIBE_MODELS.split(",")))}
+
+    async def accept(text: str) -> bool:
+        return await run_in_threadpool(flow_manager.is_complete, call_sid, text, restaurant)
+
+    try:
+        return await hedge.pick(fast, racers, accept)
+    finally:
+        if clip:
+            clip.cancel()
+
 @app.post("/voice/input")
-async def voice_input(request: Request, CallSid: str = Form(...), To: str = Form(...), SpeechResult: str = Form(None), Digits: str = Form(None), RecordingUrl: str = Form(None)):
+async def voice_input(request: Request, CallSid: str = Form(...), To: str = Form(...), SpeechResult: str = Form(None), Digits: str = Form(None), RecordingUrl: str = Form(None), Confidence: float = Form(None)):
     """
     Callback for Twilio <Gather> (Built-in STT)
     """
-    # Updated to handle RecordingUrl for OpenAI Whisper
     user_input = SpeechResult or Digits
-    
+
+    restaurant = get_restaurant_by_phone(To)
+    if not restaurant:
+         return Response(content="<Response><Say>System Error.</Say></Response>", media_type="application/xml")
+
     if RecordingUrl:
         logger.info(f"Received RecordingUrl: {RecordingUrl}")
         try:
-            from .services.transcriber import transcriber
-            import os
-            import uuid
-            os.makedirs("temp_audio", exist_ok=True)
-            file_id = f"{CallSid}_{uuid.uuid4().hex[:6]}"
-            raw_audio_path = f"temp_audio/{file_id}_raw.wav"
-            if transcriber.download_audio(RecordingUrl, raw_audio_path):
-                transcript_text = transcriber.transcribe(raw_audio_path)
-                logger.info(f"Whisper Transcript: {transcript_text}")
-                if transcript_text:
-                    user_input = transcript_text
-            if os.path.exists(raw_audio_path): os.remove(raw_audio_path)
+            transcript = await _transcribe_recording(CallSid, restaurant, RecordingUrl, SpeechResult, Confidence)
+            if transcript and transcript.no_speech:
+                # Nobody spoke: the turn is silence, unless a key was pressed
+                user_input = Digits
+            elif transcript:
+                user_input = transcript.text
         except Exception as e:
             logger.error(f"Error in transcription flow: {e}")
 
-    restaurant = get_restaurant_by_phone(To)
-    if not restaurant:
-         return Response(content="<Response><Say>System Error.</Say></Response>", media_type="application/xml")
-
     try:
         scheme = request.headers.get("x-forwarded-proto", "https")
         host = request.headers.get("host", settings.SERVER_HOST.replace("https://", ""))
         callback_url = f"{scheme}://{host}/voice/input"
         logger.info(f"Input from {CallSid}: {user_input} | Callback: {callback_url}")
         
-        twiml = flow_manager.process_input(CallSid, user_input or "", restaurant, callback_url)
+        # The state machine is synchronous (order writes, menu matching); keep it off the event loop
+        twiml = await run_in_threadpool(flow_manager.process_input, CallSid, user_input or "", restaurant, callback_url)
         logger.info(f"Returning TwiML for {CallSid}: {twiml}")
         return Response(content=twiml, media_type="application/xml")
     except Exception as e:
         logger.error(f"Error in voice_input: {e}")
         return Response(content="<Response><Say>Processing error.</Say></Response>", media_type="application/xml")
 
-# WebSocket kept for reference/integration
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
+    """
+    Twilio Media Stream of a call's audio (streaming STT providers): transcripts drive the call directly.
+    """
     await websocket.accept()
     logger.info("WebSocket connected for Audio Stream")
-    await websocket.close()
+    if not flow_manager.streaming:
+        logger.warning(f"STT provider '{settings.STT_PROVIDER}' does not take media streams; closing")
+        await websocket.close()
+        return
+    from .services.media_stream import MediaStreamCall
+    await MediaStreamCall(flow_manager, stt_provider).run(websocket)
@@ -1,8 +1,11 @@
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Set
 from pydantic import BaseModel
 import logging
 import re
 import os
+import bisect
+import hashlib
+from ..services.spoken_numbers import rank_ids
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -29,6 +32,8 @@ class Restaurant(BaseModel):
     phone_number: str
     menu: List[MenuItem]
     categories: List[str]
+    # Extra yes/no/done phrases per stage, e.g. {"ASK_ADD_MORE": {"done": ["eso es todo"]}}
+    intent_vocabulary: Dict[str, Dict[str, List[str]]] = {}
 
 # --- FALLBACK EMBEDDED MENU ---
 EMBEDDED_MENU_DATA = [
@@ -126,6 +131,110 @@ def build_menu_from_embedded() -> List[MenuItem]:
         ))
     return menu_items
 
+# --- MENU INDEX ---
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+def normalize_name(text: str) -> str:
+    return text.lower().replace(".", "").strip()
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+def to_cents(amount: float) -> int:
+    return int(round(amount * 100))
+
+def menu_version(menu: List[MenuItem]) -> str:
+    digest = hashlib.sha1()
+    for item in menu:
+        digest.update(item.model_dump_json().encode())
+    return digest.hexdigest()[:12]
+
+class MenuIndex:
+    """
+    Lookup tables built once per menu so per-utterance matching does not scan it.
+    - by_id: stripped item ID -> item
+    - names: lowercased item names, in menu order
+    - tokens: word -> positions (menu order) of the items whose name contains it
+    - suffixes: every suffix of every word -> positions, sorted for prefix search,
+      so partial words ("dumpling", "chick") still find their items
+    - version: content hash of the menu, for keying caches derived from it
+    """
+    def __init__(self, menu: List[MenuItem]):
+        self.menu = menu
+        self.version = menu_version(menu)
+        self.by_id: Dict[str, MenuItem] = {}
+        self.names: List[str] = []
+        self.tokens: Dict[str, List[int]] = {}
+        self.untokenized: List[int] = []
+
+        suffixes: Dict[str, Set[int]] = {}
+        for pos, item in enumerate(menu):
+            self.by_id.setdefault(str(item.id).strip(), item)
+            name = item.name.lower()
+            self.names.append(name)
+            words = set(tokenize(name))
+            if not words:
+                self.untokenized.append(pos)
+            for tok in words:
+                self.tokens.setdefault(tok, []).append(pos)
+                for i in range(len(tok)):
+                    suffixes.setdefault(tok[i:], set()).add(pos)
+
+        self.suffix_keys: List[str] = sorted(suffixes)
+        self.suffix_positions: List[Set[int]] = [suffixes[k] for k in self.suffix_keys]
+
+    def get(self, item_id: str) -> Optional[MenuItem]:
+        return self.by_id.get(item_id)
+
+    def _candidates(self, cleaned: str) -> Set[int]:
+        words = set(tokenize(cleaned))
+        if not words:
+            return set(range(len(self.menu)))
+
+        # Speech inside a name: every spoken word is a substring of some word of that name
+        inside: Optional[Set[int]] = None
+        for word in words:
+            hits: Set[int] = set()
+            i = bisect.bisect_left(self.suffix_keys, word)
+            while i < len(self.suffix_keys) and self.suffix_keys[i].startswith(word):
+                hits.update(self.suffix_positions[i])
+                i += 1
+            inside = hits if inside is None else inside & hits
+            if not inside:
+                break
+
+        # Name inside speech: some word of that name is a substring of a spoken word
+        positions: Set[int] = set(self.untokenized)
+        positions.update(inside or ())
+        for word in words:
+            for a in range(len(word)):
+                for b in range(a + 1, len(word) + 1):
+                    hit = self.tokens.get(word[a:b])
+                    if hit:
+                        positions.update(hit)
+        return positions
+
+    def match_name(self, cleaned: str) -> Optional[MenuItem]:
+        """First item (in menu order) whose name contains, or is contained in, the cleaned speech."""
+        if not self.menu:
+            return None
+        for pos in sorted(self._candidates(cleaned)):
+            name = self.names[pos]
+            if name in cleaned or cleaned in name:
+                return self.menu[pos]
+        return None
+
+_menu_indexes: Dict[str, MenuIndex] = {}
+
+def get_menu_index(restaurant: Restaurant) -> MenuIndex:
+    """Returns the cached index for the restaurant, rebuilding it if its menu was replaced."""
+    indexes = _menu_indexes   # one snapshot: a reload swapping the dict mid-call only loses this entry
+    index = indexes.get(restaurant.id)
+    if index is None or index.menu is not restaurant.menu:
+        index = MenuIndex(restaurant.menu)
+        indexes[restaurant.id] = index
+    return index
+
 # --- INITIALIZATION ---
 # Always use embedded menu to ensure it WORKS immediately
 full_menu = build_menu_from_embedded()
@@ -141,25 +250,80 @@ restaurants_db = [
     )
 ]
 
+def normalize_phone(phone: str) -> str:
+    """
+    Normalizes a phone number to E.164 (e.g. "(980) 983-2989" -> "+19809832989").
+    Bare 10-digit numbers are assumed to be North American (+1).
+    """
+    if not phone:
+        return ""
+    digits = "".join(ch for ch in phone if ch.isdigit())
+    if not digits:
+        return ""
+    if phone.strip().startswith("+"):
+        return f"+{digits}"
+    if digits.startswith("00"):
+        return f"+{digits[2:]}"
+    if len(digits) == 10:
+        return f"+1{digits}"
+    return f"+{digits}"
+
+class TenantRegistry:
+    """
+    Phone number -> Restaurant lookup shared by every webhook.
+    The phone table and the menu indexes are rebuilt off to the side and each swapped in with a
+    single assignment, so readers never see a half-built table during a hot reload. Indexes of
+    restaurants that are no longer loaded go with the old table.
+    """
+    def __init__(self, restaurants: List[Restaurant]):
+        self._by_phone: Dict[str, Restaurant] = {}
+        self.load(restaurants)
+
+    def load(self, restaurants: List[Restaurant]):
+        global _menu_indexes
+        by_phone: Dict[str, Restaurant] = {}
+        indexes: Dict[str, MenuIndex] = {}
+        for r in restaurants:
+            key = normalize_phone(r.phone_number)
+            if key in by_phone:
+                logger.warning(f"[TenantRegistry] Duplicate phone {key}: '{by_phone[key].name}' replaced by '{r.name}'")
+            by_phone[key] = r
+            indexes[r.id] = MenuIndex(r.menu)
+        self._by_phone = by_phone
+        _menu_indexes = indexes
+        logger.info(f"[TenantRegistry] Loaded {len(by_phone)} restaurants.")
+
+    def reload(self, restaurants: List[Restaurant]):
+        """Hot-reload entry point; safe to call while calls are in flight."""
+        self.load(restaurants)
+
+    def get(self, phone: str) -> Optional[Restaurant]:
+        by_phone = self._by_phone
+        restaurant = by_phone.get(normalize_phone(phone))
+        if restaurant is None and len(by_phone) == 1:
+            # Single-tenant deployments keep answering on any number (e.g. forwarded lines)
+            return next(iter(by_phone.values()))
+        return restaurant
+
+    def restaurants(self) -> List[Restaurant]:
+        return list(self._by_phone.values())
+
+    def __len__(self) -> int:
+        return len(self._by_phone)
+
+tenant_registry = TenantRegistry(restaurants_db)
+
 def get_restaurant_by_phone(phone: str) -> Optional[Restaurant]:
-    return restaurants_db[0]
+    return tenant_registry.get(phone)
 
 def find_item_by_id(input_text: str, restaurant: Restaurant) -> Optional[MenuItem]:
-    digits = "".join(re.findall(r"\d", input_text))
-    if not digits:
-        word_map = {"ten": "10", "eleven": "11", "twelve": "12", "thirteen": "13", "fourteen": "14", "fifteen": "15", "sixteen": "16", "seventeen": "17", "eighteen": "18", "nineteen": "19", "twenty": "20"}
-        for word, val in word_map.items():
-            if word in input_text.lower():
-                digits = val
-                break
-
-    if digits and len(digits) >= 2:
-        target_id = digits[:2]
-        logger.info(f"[find_item_by_id] Search ID: '{target_id}' (In menu of {len(restaurant.menu)} items)")
-        for item in restaurant.menu:
-            if str(item.id).strip() == target_id:
-                logger.info(f"[find_item_by_id] MATCH: {item.name}")
-                return item
+    """Reads a spoken or keyed dish number ("42", "forty two", "four two", "for to") against the menu's IDs."""
+    index = get_menu_index(restaurant)
+    candidates = rank_ids(input_text, index.by_id)
+    if candidates:
+        item = index.get(candidates[0].digits)
+        logger.debug(f"[find_item_by_id] '{candidates[0].digits}' -> {item.name}")
+        return item
     
     return None
 
@@ -167,8 +331,4 @@ def find_item_by_speech(speech_text: str, restaurant: Restaurant) -> Optional[Me
     item = find_item_by_id(speech_text, restaurant)
     if item: return item
     
-    cleaned = speech_text.lower().replace(".", "").strip()
-    for item in restaurant.menu:
-        if item.name.lower() in cleaned or cleaned in item.name.lower():
-            return item
-    return None
+    return get_menu_index(restaurant).match_name(normalize_name(speech_text))
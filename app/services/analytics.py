@@ -0,0 +1,375 @@
+import os
+import json
+import logging
+import datetime
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+HOURS = 24
+
+class Column:
+    """One fixed-width column: a raw little-endian file on disk, mirrored by a growable in-memory array."""
+    def __init__(self, path: str, dtype: str):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.data = np.empty(0, dtype=self.dtype)
+        self.size = 0
+
+    def load(self, size: int):
+        data = np.fromfile(self.path, dtype=self.dtype) if os.path.exists(self.path) else np.empty(0, self.dtype)
+        if len(data) < size:
+            raise ValueError(f"{self.path}: {len(data)} rows on disk, metadata says {size}")
+        if len(data) > size:
+            # Rows appended after the last metadata commit (crash mid-sync); they are re-ingested
+            with open(self.path, "rb+") as f:
+                f.truncate(size * self.dtype.itemsize)
+        self.data = data[:size].copy()
+        self.size = size
+
+    def append(self, values: np.ndarray):
+        values = np.asarray(values, dtype=self.dtype)
+        needed = self.size + len(values)
+        if needed > len(self.data):
+            grown = np.empty(max(needed, 2 * len(self.data), 1024), dtype=self.dtype)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+        self.data[self.size:needed] = values
+        self.size = needed
+        with open(self.path, "ab") as f:
+            values.tofile(f)
+
+    def reset(self):
+        self.data = np.empty(0, dtype=self.dtype)
+        self.size = 0
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    @property
+    def values(self) -> np.ndarray:
+        return self.data[:self.size]
+
+class Table:
+    """Columns of equal length. Tracks whether "ts" is non-decreasing so time ranges can be sliced, not masked."""
+    def __init__(self, directory: str, name: str, schema: Dict[str, str]):
+        self.name = name
+        self.columns = {col: Column(os.path.join(directory, f"{name}.{col}.bin"), dtype) for col, dtype in schema.items()}
+        self.ts_sorted = True
+
+    def __getitem__(self, col: str) -> np.ndarray:
+        return self.columns[col].values
+
+    def __len__(self) -> int:
+        return next(iter(self.columns.values())).size
+
+    def check_sorted(self):
+        ts = self["ts"]
+        self.ts_sorted = bool(np.all(ts[1:] >= ts[:-1]))
+
+    def append(self, rows: Dict[str, np.ndarray]):
+        ts = rows["ts"]
+        if self.ts_sorted and len(ts):
+            previous = self["ts"][-1:]
+            self.ts_sorted = bool(np.all(ts[1:] >= ts[:-1])) and (not len(previous) or ts[0] >= previous[0])
+        for col, column in self.columns.items():
+            column.append(rows[col])
+
+    def select(self, since: Optional[float], until: Optional[float]) -> Dict[str, np.ndarray]:
+        cols = {c: self[c] for c in self.columns}
+        if since is None and until is None:
+            return cols
+        ts = cols["ts"]
+        if self.ts_sorted:
+            # Orders normally arrive in time order: binary search and take views
+            lo = np.searchsorted(ts, since, side="left") if since is not None else 0
+            hi = np.searchsorted(ts, until, side="left") if until is not None else len(ts)
+            return {c: v[lo:hi] for c, v in cols.items()}
+        mask = np.ones(len(ts), dtype=bool)
+        if since is not None:
+            mask &= ts >= since
+        if until is not None:
+            mask &= ts < until
+        return {c: v[mask] for c, v in cols.items()}
+
+class Dictionary:
+    """String <-> dense integer code, so group-by keys are array indexes."""
+    def __init__(self, values: Optional[List[str]] = None):
+        self.values: List[str] = list(values or [])
+        self.codes = {v: i for i, v in enumerate(self.values)}
+
+    def code(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+def _grow(array: np.ndarray, shape: Tuple[int, ...]) -> np.ndarray:
+    if array.shape == shape:
+        return array
+    grown = np.zeros(shape, dtype=array.dtype)
+    grown[tuple(slice(0, n) for n in array.shape)] = array
+    return grown
+
+class Aggregates:
+    """Dense group-by results. Sums of Aggregates over disjoint rows equal the Aggregates of their union."""
+    def __init__(self, n_restaurants: int = 0, n_items: int = 0, n_choices: int = 0):
+        self.orders = np.zeros(n_restaurants, dtype=np.int64)
+        self.revenue_cents = np.zeros(n_restaurants, dtype=np.int64)
+        self.lines = np.zeros(n_restaurants, dtype=np.int64)
+        self.item_hours = np.zeros((n_items, HOURS), dtype=np.int64)
+        self.choices = np.zeros((n_restaurants, n_choices), dtype=np.int64)
+
+    @classmethod
+    def tally(cls, orders: Dict[str, np.ndarray], lines: Dict[str, np.ndarray], options: Dict[str, np.ndarray],
+              n_restaurants: int, n_items: int, n_choices: int) -> "Aggregates":
+        agg = cls()
+        agg.orders = np.bincount(orders["restaurant"], minlength=n_restaurants)
+        agg.revenue_cents = np.bincount(orders["restaurant"], weights=orders["total_cents"], minlength=n_restaurants).astype(np.int64)
+        agg.lines = np.bincount(orders["restaurant"], weights=orders["lines"], minlength=n_restaurants).astype(np.int64)
+        # 2-D group-bys flatten the key pair into one index and reshape the counts
+        agg.item_hours = np.bincount(
+            lines["item"].astype(np.int64) * HOURS + lines["hour"], weights=lines["quantity"], minlength=n_items * HOURS
+        ).astype(np.int64).reshape(n_items, HOURS)
+        agg.choices = np.bincount(
+            options["restaurant"].astype(np.int64) * n_choices + options["choice"], weights=options["quantity"],
+            minlength=n_restaurants * n_choices
+        ).astype(np.int64).reshape(n_restaurants, n_choices)
+        return agg
+
+    def add(self, other: "Aggregates"):
+        n_restaurants = max(len(self.orders), len(other.orders))
+        n_items = max(len(self.item_hours), len(other.item_hours))
+        n_choices = max(self.choices.shape[1], other.choices.shape[1])
+        for name, shape in (
+            ("orders", (n_restaurants,)),
+            ("revenue_cents", (n_restaurants,)),
+            ("lines", (n_restaurants,)),
+            ("item_hours", (n_items, HOURS)),
+            ("choices", (n_restaurants, n_choices)),
+        ):
+            setattr(self, name, _grow(getattr(self, name), shape) + _grow(getattr(other, name), shape))
+
+class OrderAnalytics:
+    """
+    Columnar copy of the order history for reporting.
+    Orders are flattened into three tables (orders, order lines, chosen options) of fixed-width
+    NumPy columns with string keys dictionary-encoded, so every report is a handful of vectorized
+    bincount group-bys instead of a JSON scan. sync() tails the order store from a saved watermark
+    and folds only the new rows into running all-time aggregates; time-filtered reports scan the
+    columns directly. Everything here is derived data: if the files and metadata disagree, the
+    copy is rebuilt from the order store.
+    """
+    ORDER_SCHEMA = {"ts": "<i8", "restaurant": "<i4", "total_cents": "<i8", "lines": "<i4"}
+    LINE_SCHEMA = {"ts": "<i8", "hour": "u1", "restaurant": "<i4", "item": "<i4", "quantity": "<i4", "cents": "<i8"}
+    OPTION_SCHEMA = {"ts": "<i8", "restaurant": "<i4", "choice": "<i4", "quantity": "<i4"}
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or settings.ANALYTICS_DIR
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.skipped = 0   # malformed orders passed over since startup
+
+    def _reset(self):
+        self.restaurants = Dictionary()
+        self.items = Dictionary()     # "restaurant_id/item_id"
+        self.item_names: List[str] = []
+        self.choices = Dictionary()   # "Option\tChoice"
+        self.watermark = 0
+        self.totals = Aggregates()
+
+    def _load(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.tables = {
+            "orders": Table(self.directory, "orders", self.ORDER_SCHEMA),
+            "lines": Table(self.directory, "lines", self.LINE_SCHEMA),
+            "options": Table(self.directory, "options", self.OPTION_SCHEMA),
+        }
+        self._reset()
+        meta_path = os.path.join(self.directory, "meta.json")
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            for name, table in self.tables.items():
+                for column in table.columns.values():
+                    column.load(meta["rows"][name])
+                table.check_sorted()
+            self.restaurants = Dictionary(meta["restaurants"])
+            self.items = Dictionary(meta["items"])
+            self.item_names = meta["item_names"]
+            self.choices = Dictionary(meta["choices"])
+            self.watermark = meta["watermark"]
+            self.totals = self._tally()
+        except (OSError, ValueError, KeyError) as e:
+            if os.path.exists(meta_path):
+                logger.warning(f"Analytics store in {self.directory} is inconsistent ({e}); rebuilding from the order store")
+            self._reset()
+            for table in self.tables.values():
+                for column in table.columns.values():
+                    column.reset()
+        self._loaded = True
+
+    def _save_meta(self):
+        # The metadata file is the commit point: rows past its counts are discarded on load
+        meta = {
+            "rows": {name: len(table) for name, table in self.tables.items()},
+            "restaurants": self.restaurants.values,
+            "items": self.items.values,
+            "item_names": self.item_names,
+            "choices": self.choices.values,
+            "watermark": self.watermark,
+        }
+        path = os.path.join(self.directory, "meta.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(path + ".tmp", path)
+
+    def ingest(self, orders: Iterable[Dict[str, Any]]) -> int:
+        """Appends orders to the columns and folds them into the running totals."""
+        o_rows: Dict[str, list] = {c: [] for c in self.ORDER_SCHEMA}
+        l_rows: Dict[str, list] = {c: [] for c in self.LINE_SCHEMA}
+        p_rows: Dict[str, list] = {c: [] for c in self.OPTION_SCHEMA}
+        count = 0
+        for order in orders:
+            try:
+                rows = self._order_rows(order)
+            except (AttributeError, KeyError, TypeError, ValueError) as e:
+                # One bad record must not stop every later order from being counted
+                logger.warning(f"[OrderAnalytics] Skipping malformed order {order.get('call_sid', '?') if isinstance(order, dict) else '?'}: {e!r}")
+                self.skipped += 1
+                continue
+            for table, row in zip((o_rows, l_rows, p_rows), rows):
+                for c, values in row.items():
+                    table[c].extend(values)
+            count += 1
+        if not count:
+            return 0
+
+        new = {}
+        for name, rows, schema in (("orders", o_rows, self.ORDER_SCHEMA), ("lines", l_rows, self.LINE_SCHEMA), ("options", p_rows, self.OPTION_SCHEMA)):
+            new[name] = {c: np.asarray(rows[c], dtype=schema[c]) for c in schema}
+            self.tables[name].append(new[name])
+        self.totals.add(Aggregates.tally(new["orders"], new["lines"], new["options"], *self._sizes()))
+        return count
+
+    def _order_rows(self, order: Dict[str, Any]) -> Tuple[Dict[str, list], Dict[str, list], Dict[str, list]]:
+        """One order's rows for the orders, lines and options columns; raises if the record is malformed."""
+        when = datetime.datetime.fromisoformat(order["timestamp"])
+        ts = int(when.timestamp())
+        rid = order.get("restaurant_id") or order.get("restaurant", "")
+        items = order.get("items", [])
+        lines = [(f"{rid}/{line['id']}", line.get("name", ""), int(line.get("quantity", 1)),
+                  int(round(line.get("total", 0) * 100)), [f"{opt['name']}\t{opt['choice']}" for opt in line.get("options", [])])
+                 for line in items]
+        total_cents = int(round(order.get("total_price", 0) * 100))
+        # Codes are handed out only once the whole record has parsed
+        restaurant = self.restaurants.code(rid)
+        o_rows = {"ts": [ts], "restaurant": [restaurant], "total_cents": [total_cents],
+                  "lines": [sum(quantity for _, _, quantity, _, _ in lines)]}
+        l_rows: Dict[str, list] = {c: [] for c in self.LINE_SCHEMA}
+        p_rows: Dict[str, list] = {c: [] for c in self.OPTION_SCHEMA}
+        for key, name, quantity, cents, options in lines:
+            item = self.items.code(key)
+            if item == len(self.item_names):
+                self.item_names.append(name)
+            l_rows["ts"].append(ts)
+            l_rows["hour"].append(when.hour)
+            l_rows["restaurant"].append(restaurant)
+            l_rows["item"].append(item)
+            l_rows["quantity"].append(quantity)
+            l_rows["cents"].append(cents)
+            for choice in options:
+                p_rows["ts"].append(ts)
+                p_rows["restaurant"].append(restaurant)
+                p_rows["choice"].append(self.choices.code(choice))
+                p_rows["quantity"].append(quantity)
+        return o_rows, l_rows, p_rows
+
+    def _sizes(self) -> Tuple[int, int, int]:
+        return len(self.restaurants), len(self.items), len(self.choices)
+
+    def _tally(self, since: Optional[float] = None, until: Optional[float] = None) -> Aggregates:
+        selected = [self.tables[name].select(since, until) for name in ("orders", "lines", "options")]
+        return Aggregates.tally(*selected, *self._sizes())
+
+    def sync(self, sink) -> int:
+        """Pulls orders written since the last sync from the order store. Returns how many were added."""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            added = 0
+            start = self.watermark
+            while True:
+                orders, position = sink.read_since(self.watermark, limit=settings.ANALYTICS_SYNC_BATCH)
+                if not orders:
+                    break
+                added += self.ingest(orders)
+                self.watermark = position
+            if self.watermark != start:
+                self._save_meta()
+            return added
+
+    def report(self, restaurant_id: Optional[str] = None, since: Optional[float] = None,
+               until: Optional[float] = None, top: int = 5) -> Dict[str, Any]:
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            agg = self.totals if since is None and until is None else self._tally(since, until)
+            n_restaurants, n_items, n_choices = self._sizes()
+            agg.add(Aggregates(n_restaurants, n_items, n_choices))  # pad to the current dictionary sizes
+
+            if restaurant_id is not None:
+                code = self.restaurants.codes.get(restaurant_id)
+                rows = np.array([code] if code is not None else [], dtype=np.int64)
+            else:
+                rows = np.arange(n_restaurants)
+            rows = rows[agg.orders[rows] > 0]
+
+            restaurants = []
+            for r in rows:
+                orders = int(agg.orders[r])
+                restaurants.append({
+                    "restaurant_id": self.restaurants.values[r],
+                    "orders": orders,
+                    "revenue": agg.revenue_cents[r] / 100,
+                    "avg_basket_items": round(agg.lines[r] / orders, 2),
+                    "avg_basket_value": round(agg.revenue_cents[r] / orders / 100, 2),
+                })
+
+            # Item keys are "restaurant_id/item_id"; keep the items of the selected restaurants
+            item_restaurant = np.array([k.rsplit("/", 1)[0] for k in self.items.values], dtype=object)
+            selected_ids = {self.restaurants.values[r] for r in rows}
+            item_mask = np.fromiter((k in selected_ids for k in item_restaurant), dtype=bool, count=n_items)
+            item_hours = np.where(item_mask[:, None], agg.item_hours, 0)
+
+            hourly = {}
+            for hour in np.nonzero(item_hours.sum(axis=0))[0]:
+                counts = item_hours[:, hour]
+                best = np.argsort(-counts, kind="stable")[:top]
+                hourly[f"{hour:02d}"] = [
+                    {"item": self.items.values[i], "name": self.item_names[i], "count": int(counts[i])}
+                    for i in best if counts[i] > 0
+                ]
+
+            option_mix: Dict[str, Dict[str, int]] = {}
+            choice_counts = agg.choices[rows].sum(axis=0) if len(rows) else np.zeros(n_choices, dtype=np.int64)
+            for c in np.nonzero(choice_counts)[0]:
+                option, choice = self.choices.values[c].split("\t", 1)
+                option_mix.setdefault(option, {})[choice] = int(choice_counts[c])
+
+            return {
+                "orders": int(agg.orders[rows].sum()),
+                "order_lines": int(agg.lines[rows].sum()),
+                "restaurants": restaurants,
+                "hourly_popularity": hourly,
+                "option_mix": option_mix,
+            }
+
+# Global instance
+analytics = OrderAnalytics()
@@ -0,0 +1,284 @@
+import io
+import math
+import struct
+import wave
+import logging
+from typing import Dict, Optional, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TARGET_RATE = 16000
+
+# WAVE format tags
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_ALAW = 0x0006
+WAVE_FORMAT_MULAW = 0x0007
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+class UnsupportedAudio(ValueError):
+    """Raised for containers/codecs the in-process path does not handle (use ffmpeg)."""
+
+def _mulaw_table() -> np.ndarray:
+    u = ~np.arange(256, dtype=np.int32) & 0xFF
+    sign = u & 0x80
+    exponent = (u >> 4) & 0x07
+    mantissa = u & 0x0F
+    magnitude = (((mantissa << 3) + 0x84) << exponent) - 0x84
+    return np.where(sign, -magnitude, magnitude).astype(np.float32) / 32768.0
+
+def _alaw_table() -> np.ndarray:
+    a = np.arange(256, dtype=np.int32) ^ 0x55
+    sign = a & 0x80
+    exponent = (a >> 4) & 0x07
+    mantissa = a & 0x0F
+    magnitude = np.where(exponent == 0, (mantissa << 4) + 8, ((mantissa << 4) + 0x108) << np.maximum(exponent - 1, 0))
+    return np.where(sign, magnitude, -magnitude).astype(np.float32) / 32768.0
+
+MULAW_TABLE = _mulaw_table()
+ALAW_TABLE = _alaw_table()
+
+def decode_mulaw(data: bytes) -> np.ndarray:
+    """G.711 μ-law bytes (e.g. Twilio media stream payloads) -> float32 samples in [-1, 1)."""
+    return MULAW_TABLE[np.frombuffer(data, dtype=np.uint8)]
+
+def decode_alaw(data: bytes) -> np.ndarray:
+    return ALAW_TABLE[np.frombuffer(data, dtype=np.uint8)]
+
+def decode_pcm(data: bytes, bits: int) -> np.ndarray:
+    """Little-endian integer PCM -> float32 samples in [-1, 1)."""
+    if bits == 8:
+        return (np.frombuffer(data, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    if bits == 16:
+        return np.frombuffer(data, dtype="<i2").astype(np.float32) / 32768.0
+    if bits == 24:
+        raw = np.frombuffer(data[: len(data) - len(data) % 3], dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        ints = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+        ints = np.where(ints & 0x800000, ints - 0x1000000, ints)
+        return ints.astype(np.float32) / 8388608.0
+    if bits == 32:
+        return (np.frombuffer(data, dtype="<i4").astype(np.float64) / 2147483648.0).astype(np.float32)
+    raise UnsupportedAudio(f"{bits}-bit PCM")
+
+def _read_chunks(data: bytes) -> Dict[bytes, memoryview]:
+    if len(data) < 12 or data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        raise UnsupportedAudio("not a RIFF/WAVE file")
+    view = memoryview(data)
+    chunks: Dict[bytes, memoryview] = {}
+    pos = 12
+    while pos + 8 <= len(data):
+        cid = bytes(view[pos:pos + 4])
+        size = struct.unpack_from("<I", data, pos + 4)[0]
+        body = view[pos + 8:pos + 8 + size]
+        chunks.setdefault(cid, body)
+        if cid == b"data":
+            break
+        pos += 8 + size + (size & 1)
+    if b"fmt " not in chunks or b"data" not in chunks:
+        raise UnsupportedAudio("missing fmt or data chunk")
+    return chunks
+
+def decode_wav(data: bytes) -> Tuple[np.ndarray, int]:
+    """
+    Decodes a WAV file held in memory.
+    Returns (samples, sample_rate) with samples shaped (frames, channels), float32 in [-1, 1).
+    Handles PCM 8/16/24/32-bit, 32-bit float, μ-law and A-law (what Twilio and phone systems produce).
+    """
+    chunks = _read_chunks(data)
+    fmt = chunks[b"fmt "]
+    if len(fmt) < 16:
+        raise UnsupportedAudio("short fmt chunk")
+    tag, channels, rate, _, _, bits = struct.unpack_from("<HHIIHH", fmt)
+    if tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+        tag = struct.unpack_from("<H", fmt, 24)[0]
+    if channels < 1 or rate < 1:
+        raise UnsupportedAudio("bad channel count or rate")
+
+    payload = bytes(chunks[b"data"])
+    if tag == WAVE_FORMAT_PCM:
+        samples = decode_pcm(payload, bits)
+    elif tag == WAVE_FORMAT_IEEE_FLOAT and bits == 32:
+        samples = np.frombuffer(payload[: len(payload) - len(payload) % 4], dtype="<f4")
+    elif tag == WAVE_FORMAT_MULAW:
+        samples = decode_mulaw(payload)
+    elif tag == WAVE_FORMAT_ALAW:
+        samples = decode_alaw(payload)
+    else:
+        raise UnsupportedAudio(f"WAVE format tag {tag:#06x}")
+
+    frames = len(samples) // channels
+    return samples[: frames * channels].reshape(frames, channels), rate
+
+def to_mono(samples: np.ndarray) -> np.ndarray:
+    if samples.ndim == 1:
+        return samples
+    if samples.shape[1] == 1:
+        return samples[:, 0]
+    return samples.mean(axis=1, dtype=np.float32)
+
+# Filter design: half-length in zero crossings of the sinc, and window shape
+ZERO_CROSSINGS = 16
+KAISER_BETA = 8.0
+
+_filters: Dict[Tuple[int, int], np.ndarray] = {}
+
+def _polyphase_filter(up: int, down: int) -> np.ndarray:
+    """Kaiser-windowed sinc low-pass split into `up` phases, shape (up, taps_per_phase)."""
+    key = (up, down)
+    if key in _filters:
+        return _filters[key]
+    factor = max(up, down)
+    half = ZERO_CROSSINGS * factor
+    k = np.arange(-half, half + 1, dtype=np.float64)
+    cutoff = 1.0 / factor  # fraction of the upsampled Nyquist
+    h = cutoff * np.sinc(cutoff * k) * np.kaiser(len(k), KAISER_BETA) * up
+    taps = math.ceil(len(h) / up)
+    h = np.concatenate([h, np.zeros(taps * up - len(h))])
+    # phase r holds h[r], h[r + up], h[r + 2*up], ...
+    phases = h.reshape(taps, up).T.astype(np.float32)
+    _filters[key] = phases
+    return phases
+
+def resample(x: np.ndarray, rate_in: int, rate_out: int, block: int = 16384) -> np.ndarray:
+    """Polyphase rational resampling of a mono float32 signal, vectorized over output blocks."""
+    if rate_in == rate_out or len(x) == 0:
+        return x.astype(np.float32, copy=False)
+    g = math.gcd(rate_in, rate_out)
+    up, down = rate_out // g, rate_in // g
+    phases = _polyphase_filter(up, down)
+    taps = phases.shape[1]
+    delay = ZERO_CROSSINGS * max(up, down)  # centre tap, in upsampled samples
+
+    n_out = (len(x) * up + down - 1) // down
+    # Pad so every tap index lands inside the buffer
+    pad = taps + 1
+    xp = np.concatenate([np.zeros(pad, np.float32), x.astype(np.float32, copy=False), np.zeros(pad, np.float32)])
+    j = np.arange(taps)
+
+    out = np.empty(n_out, dtype=np.float32)
+    for start in range(0, n_out, block):
+        m = np.arange(start, min(start + block, n_out))
+        n = m * down + delay
+        r = n % up
+        base = n // up + pad
+        window = xp[base[:, None] - j[None, :]]
+        out[start:start + len(m)] = np.einsum("ij,ij->i", window, phases[r])
+    return out
+
+def encode_wav(samples: np.ndarray, rate: int) -> bytes:
+    """Mono float32 samples -> 16-bit PCM WAV bytes."""
+    pcm = (np.clip(samples, -1.0, 1.0 - 1.0 / 32768) * 32768.0).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+def convert_wav(data: bytes, rate_out: int = TARGET_RATE) -> bytes:
+    """WAV bytes in any supported encoding -> 16-bit mono WAV at `rate_out`, entirely in memory."""
+    samples, rate = decode_wav(data)
+    return encode_wav(resample(to_mono(samples), rate, rate_out), rate_out)
+
+# Voice activity detection on 20 ms frames. A frame is speech if it is loud enough above the clip's
+# noise floor, or if it is a fricative ("s", "f": noisy, high zero-crossing rate) not far below that.
+VAD_FRAME_MS = 20
+VAD_MIN_DBFS = -45.0      # never speech below this level, however quiet the line
+VAD_MARGIN_DB = 12.0      # speech is at least this far above the noise floor
+VAD_FRICATIVE_ZCR = 0.3
+VAD_FRICATIVE_DB = 8.0    # fricatives may be this much quieter than the speech threshold
+
+def frame_features(samples: np.ndarray, rate: int, frame_ms: int = VAD_FRAME_MS) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-frame energy (dBFS) and zero-crossing rate of a mono float32 signal."""
+    n = max(2, rate * frame_ms // 1000)
+    count = len(samples) // n
+    x = samples[:count * n].reshape(count, n)
+    db = 10.0 * np.log10(np.einsum("ij,ij->i", x, x) / n + 1e-10)
+    signs = np.signbit(x)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (n - 1)
+    return db, zcr
+
+def speech_threshold(floor: float, peak: float, min_dbfs: float = VAD_MIN_DBFS) -> float:
+    # Below peak - 25 dB counts too, so a clip that is speech from end to end is not cut down to its loudest syllables
+    return max(min(floor + VAD_MARGIN_DB, peak - 25.0), min_dbfs)
+
+def speech_frames(db: np.ndarray, zcr: np.ndarray, threshold: float) -> np.ndarray:
+    voiced = db >= threshold
+    fricative = (zcr >= VAD_FRICATIVE_ZCR) & (db >= threshold - VAD_FRICATIVE_DB)
+    mask = (voiced | fricative).astype(np.int8)
+    # Majority of 5 frames: drops isolated clicks, bridges one-frame dips inside words
+    return np.convolve(mask, np.ones(5, dtype=np.int8), mode="same") >= 3
+
+def find_speech(samples: np.ndarray, rate: int, min_dbfs: float = VAD_MIN_DBFS,
+                min_speech_ms: int = 150, pad_ms: int = 250) -> Optional[Tuple[int, int]]:
+    """
+    Sample range [start, end) from just before the first speech to just after the last, padded by
+    pad_ms; None if the clip has less than min_speech_ms of speech in total.
+    """
+    db, zcr = frame_features(samples, rate)
+    if not len(db):
+        return None
+    floor, peak = float(np.percentile(db, 10)), float(db.max())
+    if peak < max(floor + VAD_MARGIN_DB, min_dbfs):
+        # Steady noise (or a quiet line) all the way through
+        return None
+    mask = speech_frames(db, zcr, speech_threshold(floor, peak, min_dbfs))
+    if np.count_nonzero(mask) * VAD_FRAME_MS < min_speech_ms:
+        return None
+    hits = np.flatnonzero(mask)
+    frame = rate * VAD_FRAME_MS // 1000
+    pad = rate * pad_ms // 1000
+    return max(0, hits[0] * frame - pad), min(len(samples), (hits[-1] + 1) * frame + pad)
+
+def trim_wav(data: bytes, **vad) -> Optional[bytes]:
+    """
+    Cuts a WAV file down to its speech (see find_speech), keeping the original encoding so nothing
+    grows. Returns the input unchanged if there is nothing to cut, None if there is no speech.
+    """
+    samples, rate = decode_wav(data)
+    span = find_speech(to_mono(samples), rate, **vad)
+    if span is None:
+        return None
+    start, end = span
+    if start == 0 and end >= len(samples):
+        return data
+    chunks = _read_chunks(data)
+    fmt = bytes(chunks[b"fmt "])
+    block_align = max(1, struct.unpack_from("<H", fmt, 12)[0])
+    body = bytes(chunks[b"data"][start * block_align:end * block_align])
+    riff = b"WAVE" + b"fmt " + struct.pack("<I", len(fmt)) + fmt + (b"\0" if len(fmt) & 1 else b"")
+    riff += b"data" + struct.pack("<I", len(body)) + body + (b"\0" if len(body) & 1 else b"")
+    return b"RIFF" + struct.pack("<I", len(riff)) + riff
+
+class VoiceActivity:
+    """
+    Running speech/pause tracker for a live μ-law stream. The noise floor follows the quiet frames,
+    so it adapts to each line. paused is True once speech has been followed by end_silence_ms of quiet.
+    """
+    def __init__(self, end_silence_ms: int = 300, min_dbfs: float = VAD_MIN_DBFS):
+        self.end_silence_ms = end_silence_ms
+        self.min_dbfs = min_dbfs
+        self.floor: Optional[float] = None
+        self.heard_speech = False
+        self.silent_ms = 0
+
+    @property
+    def paused(self) -> bool:
+        return self.heard_speech and self.silent_ms >= self.end_silence_ms
+
+    def update(self, chunk: bytes):
+        db, zcr = frame_features(decode_mulaw(chunk), 8000)
+        if not len(db):
+            return
+        quiet = float(db.min())
+        self.floor = quiet if self.floor is None else min(quiet, 0.95 * self.floor + 0.05 * quiet)
+        threshold = max(self.floor + VAD_MARGIN_DB, self.min_dbfs)
+        speech = (db >= threshold) | ((zcr >= VAD_FRICATIVE_ZCR) & (db >= threshold - VAD_FRICATIVE_DB))
+        if speech.any():
+            self.heard_speech = True
+            # Quiet frames after the last speech frame of this chunk
+            self.silent_ms = (len(speech) - 1 - int(np.flatnonzero(speech)[-1])) * VAD_FRAME_MS
+        else:
+            self.silent_ms += len(speech) * VAD_FRAME_MS
@@ -1,12 +1,15 @@
 from enum import Enum
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, NamedTuple, Tuple
 from pydantic import BaseModel
-from ..models.database import MenuItem, Restaurant, find_item_by_id, Option, OptionChoice
+from ..models.database import MenuItem, Restaurant, find_item_by_id, find_item_by_speech, get_menu_index, to_cents, Option, OptionChoice
 from ..core.prompts import Prompts
 from ..core.config import settings
-from twilio.twiml.voice_response import VoiceResponse, Gather
-import os
-import json
+from .session_store import SessionStore, create_session_store
+from .order_store import OrderSink, create_order_sink
+from . import twiml
+from .twiml import get_menu_prompts
+from .intents import Intent, intents
+from .order_parser import choice_words, match_choices, option_words, parse_order
 import datetime
 import logging
 import re
@@ -22,52 +25,84 @@ class CallStage(str, Enum):
     CONFIRMING_ORDER = "CONFIRMING_ORDER"
     COMPLETED = "COMPLETED"
 
+class OrderLine(NamedTuple):
+    """
+    One ordered dish as kept in the call session: the item ID, the chosen choice index for each
+    of the item's options (in option order), the unit price in integer cents and the quantity.
+    A plain tuple, so appending is cheap and it serializes as a short JSON array.
+    """
+    item_id: str
+    choices: Tuple[int, ...]
+    unit_cents: int
+    quantity: int = 1
+
 class SelectedOption(BaseModel):
     option_name: str
     choice_name: str
     price_extra: float
 
 class OrderItem(BaseModel):
+    """An OrderLine hydrated against the menu, built only for prompts and order persistence."""
     item: MenuItem
     selected_options: List[SelectedOption] = []
+    quantity: int = 1
+    total_cents: int = 0
     
     @property
     def total_price(self) -> float:
-        return self.item.price + sum(opt.price_extra for opt in self.selected_options)
+        return self.total_cents / 100
 
 class CallContext(BaseModel):
     call_sid: str
     stage: CallStage = CallStage.INIT
     restaurant_id: str
-    current_order: List[OrderItem] = []
+    menu_version: str = ""
+    current_order: List[OrderLine] = []
     
-    # Temporary state for current item being ordered
-    pending_item: Optional[MenuItem] = None
-    pending_options: List[SelectedOption] = []
-    current_option_index: int = 0
+    # Temporary state for current item being ordered: one choice index per option, -1 until chosen
+    pending_item_id: Optional[str] = None
+    pending_choices: List[int] = []
+    pending_quantity: int = 1
+    # Dishes from one utterance ("two number 20 and a 41"): still to be set up as
+    # (item ID, quantity, choices already named), and ready to confirm
+    queued_items: List[Tuple[str, int, Tuple[int, ...]]] = []
+    batch: List[OrderLine] = []
     
     silence_count: int = 0
-    
-    class Config:
-        arbitrary_types_allowed = True
 
-sessions: Dict[str, CallContext] = {}
+def next_option_index(choices: List[int]) -> int:
+    """First option still without a choice (len(choices) when all are filled)."""
+    for i, c in enumerate(choices):
+        if c < 0:
+            return i
+    return len(choices)
+
+def line_cents(item: MenuItem, choices: List[int]) -> int:
+    cents = to_cents(item.price)
+    for opt, c in zip(item.options, choices):
+        if c >= 0:
+            cents += to_cents(opt.choices[c].price_extra)
+    return cents
 
 class FlowManager:
-    def __init__(self):
-        pass # URL now passed per request for robustness
+    def __init__(self, store: Optional[SessionStore] = None, orders: Optional[OrderSink] = None, streaming: bool = False):
+        # URL is passed per request for robustness; call state lives in the session store
+        self.store = store or create_session_store(CallContext)
+        self.orders = orders or create_order_sink()
+        # Speech comes over a media stream (see media_stream.py); prompts only gather keypad input
+        self.streaming = streaming
 
     def get_context(self, call_sid: str, restaurant: Restaurant) -> CallContext:
-        if call_sid not in sessions:
-            sessions[call_sid] = CallContext(call_sid=call_sid, restaurant_id=restaurant.id)
-        return sessions[call_sid]
+        ctx = self.store.get(call_sid)
+        if ctx is None:
+            ctx = CallContext(call_sid=call_sid, restaurant_id=restaurant.id, menu_version=get_menu_index(restaurant).version)
+        return ctx
     
     def save_context(self, ctx: CallContext):
-        sessions[ctx.call_sid] = ctx
+        self.store.save(ctx, terminal=ctx.stage == CallStage.COMPLETED)
 
     def process_input(self, call_sid: str, input_text: str, restaurant: Restaurant, callback_url: str) -> str:
         ctx = self.get_context(call_sid, restaurant)
-        response = VoiceResponse()
         logger.info(f"[process_input] CallSid: {call_sid}, State: {ctx.stage}, Input: '{input_text}'")
         
         try:
@@ -75,10 +110,9 @@ class FlowManager:
             if not input_text or not input_text.strip():
                 ctx.silence_count += 1
                 if ctx.silence_count >= 3:
-                    response.say(Prompts.FALLBACK_GOODBYE)
-                    response.hangup()
-                    return str(response)
-                return self._respond(ctx, response, Prompts.ERROR_SILENCE, callback_url)
+                    ctx.stage = CallStage.COMPLETED
+                    return twiml.hangup(Prompts.FALLBACK_GOODBYE)
+                return self._respond(ctx, Prompts.ERROR_SILENCE, callback_url)
             
             ctx.silence_count = 0
             text = input_text.lower().strip()
@@ -89,257 +123,296 @@ class FlowManager:
 
             # 2. State Machine
             if ctx.stage == CallStage.ORDERING_ID:
-                return self._handle_ordering_id(ctx, text, restaurant, response, callback_url)
+                return self._handle_ordering_id(ctx, text, restaurant, callback_url)
                 
             elif ctx.stage == CallStage.SELECTING_VARIETY:
-                return self._handle_selecting_variety(ctx, text, restaurant, response, callback_url)
+                return self._handle_selecting_variety(ctx, text, restaurant, callback_url)
                 
             elif ctx.stage == CallStage.CONFIRMING_ITEM:
-                return self._handle_confirming_item(ctx, text, restaurant, response, callback_url)
+                return self._handle_confirming_item(ctx, text, restaurant, callback_url)
                 
             elif ctx.stage == CallStage.ASK_ADD_MORE:
-                return self._handle_ask_add_more(ctx, text, restaurant, response, callback_url)
+                return self._handle_ask_add_more(ctx, text, restaurant, callback_url)
                 
             elif ctx.stage == CallStage.CONFIRMING_ORDER:
-                return self._handle_confirming_order(ctx, text, restaurant, response, callback_url)
+                return self._handle_confirming_order(ctx, text, restaurant, callback_url)
 
             # If stage is unknown or COMPLETED
-            return self._respond(ctx, response, Prompts.ERROR_NOT_UNDERSTOOD, callback_url)
+            return self._respond(ctx, Prompts.ERROR_NOT_UNDERSTOOD, callback_url)
             
         except Exception as e:
             import traceback
             logger.error(f"Error in FlowManager: {e}")
             logger.error(traceback.format_exc())
             # Fallback to a safe response to avoid hangup
-            response = VoiceResponse()
-            response.say("I'm sorry, I encountered an internal error. Let's start over.")
             ctx.stage = CallStage.ORDERING_ID
+            return self._respond(ctx, Prompts.SPECIFY_ID, callback_url, lead="I'm sorry, I encountered an internal error. Let's start over.")
+        finally:
+            # Persist once per turn, whichever branch ran
             self.save_context(ctx)
-            return self._respond(ctx, response, Prompts.SPECIFY_ID, callback_url)
+
+    def is_complete(self, call_sid: str, text: str, restaurant: Restaurant) -> bool:
+        """
+        Whether text already answers the question the call is on (a dish, an option, yes/no), so a
+        streamed utterance can be acted on before the recognizer marks it final.
+        """
+        ctx = self.store.get(call_sid)
+        text = text.lower().strip()
+        if ctx is None or not text:
+            return False
+        if ctx.stage in (CallStage.INIT, CallStage.ORDERING_ID):
+            return bool(parse_order(text, restaurant))
+        if ctx.stage == CallStage.SELECTING_VARIETY:
+            item = self._pending_item(ctx, restaurant)
+            option_index = next_option_index(ctx.pending_choices)
+            if not item or option_index >= len(item.options):
+                return False
+            option = item.options[option_index]
+            digits = re.findall(r"\d", text)
+            if digits:
+                return any(c.id == digits[0] for c in option.choices)
+            return any(c >= 0 for c in match_choices(item, choice_words(text)))
+        if ctx.stage in (CallStage.CONFIRMING_ITEM, CallStage.ASK_ADD_MORE, CallStage.CONFIRMING_ORDER):
+            return intents.classify(ctx.stage, text, restaurant).intent != Intent.UNKNOWN
+        return False
 
     def start_call(self, call_sid: str, restaurant: Restaurant, callback_url: str) -> str:
         ctx = self.get_context(call_sid, restaurant)
         ctx.stage = CallStage.ORDERING_ID
         self.save_context(ctx)
-        
-        response = VoiceResponse()
-        return self._respond(ctx, response, Prompts.GREETING, callback_url)
+        return self._respond(ctx, Prompts.GREETING, callback_url)
 
     # --- Handlers ---
 
-    def _handle_ordering_id(self, ctx: CallContext, text: str, restaurant: Restaurant, response: VoiceResponse, callback_url: str) -> str:
-        item = find_item_by_id(text, restaurant)
-        if not item:
-            from ..models.database import find_item_by_speech
-            item = find_item_by_speech(text, restaurant)
-            
-        if item:
-            logger.info(f"[_handle_ordering_id] Found item: {item.name}, Options count: {len(item.options)}")
-            ctx.pending_item = item
-            ctx.pending_options = []
-            
-            if item.options:
-                ctx.stage = CallStage.SELECTING_VARIETY
-                ctx.current_option_index = 0
-                self.save_context(ctx)
-                
-                opt = item.options[0]
-                options_list = ", ".join([f"{c.id} for {c.name}" for c in opt.choices])
-                msg = Prompts.VARIETY_PROMPT_TEMPLATE.format(dish_name=item.name, options_list=options_list)
-                return self._respond(ctx, response, msg, callback_url)
-            else:
-                ctx.stage = CallStage.CONFIRMING_ITEM
-                self.save_context(ctx)
-                msg = Prompts.CONFIRM_DISH_TEMPLATE.format(dish_name=item.name)
-                logger.info(f"[_handle_ordering_id] Transitioning to CONFIRMING_ITEM for {item.name}")
-                return self._respond(ctx, response, msg, callback_url)
+    def _handle_ordering_id(self, ctx: CallContext, text: str, restaurant: Restaurant, callback_url: str) -> str:
+        if self._queue_items(ctx, text, restaurant):
+            return self._next_pending(ctx, restaurant, callback_url)
         
         logger.warning(f"[_handle_ordering_id] No item found for input: '{text}'")
-        return self._respond(ctx, response, Prompts.ID_NOT_FOUND, callback_url)
+        return self._respond(ctx, Prompts.ID_NOT_FOUND, callback_url)
+
+    def _queue_items(self, ctx: CallContext, text: str, restaurant: Restaurant) -> bool:
+        """Queues every dish named in the utterance. Returns False if there was none."""
+        lines = parse_order(text, restaurant)
+        if len(lines) > 1 or (lines and lines[0].quantity > 1):
+            logger.info(f"[_queue_items] Batch: {[(line.item.id, line.quantity) for line in lines]}")
+            ctx.queued_items = [(line.item.id, line.quantity, line.choices) for line in lines]
+        else:
+            item = find_item_by_id(text, restaurant) or find_item_by_speech(text, restaurant)
+            if not item:
+                return False
+            logger.info(f"[_queue_items] Found item: {item.name}, Options count: {len(item.options)}")
+            ctx.queued_items = [(item.id, 1, tuple(match_choices(item, option_words(text, item))))]
+        ctx.batch = []
+        return True
+
+    def _next_pending(self, ctx: CallContext, restaurant: Restaurant, callback_url: str) -> str:
+        """Moves queued dishes into the batch, stopping to ask for options; confirms the batch once the queue is empty."""
+        index = get_menu_index(restaurant)
+        while ctx.queued_items:
+            item_id, quantity, choices = ctx.queued_items.pop(0)
+            item = index.get(item_id)
+            if not item:
+                continue
+            choices = list(choices) if len(choices) == len(item.options) else [-1] * len(item.options)
+            # Only ask for the options the caller has not already named
+            option_index = next_option_index(choices)
+            if option_index < len(item.options):
+                ctx.pending_item_id = item.id
+                ctx.pending_choices = choices
+                ctx.pending_quantity = quantity
+                ctx.stage = CallStage.SELECTING_VARIETY
+                return self._respond(ctx, get_menu_prompts(restaurant).get(item.id).option_prompts[option_index], callback_url)
+            ctx.batch.append(OrderLine(item.id, tuple(choices), line_cents(item, choices), quantity))
+        
+        ctx.stage = CallStage.CONFIRMING_ITEM
+        logger.info(f"[_next_pending] Confirming {len(ctx.batch)} line(s)")
+        return self._respond(ctx, self._batch_prompt(ctx.batch, restaurant), callback_url)
+
+    def _batch_prompt(self, lines: List[OrderLine], restaurant: Restaurant, added: bool = False) -> str:
+        """The confirmation (or, once confirmed, the "added") prompt for a batch of lines."""
+        if len(lines) == 1 and lines[0].quantity == 1:
+            # The common case, phrased (and pre-rendered) exactly as for a single dish
+            item = get_menu_prompts(restaurant).get(lines[0].item_id)
+            return item.added if added else item.confirm_with(lines[0].choices)
+        template = Prompts.ADD_MORE if added else Prompts.CONFIRM_DISH_TEMPLATE
+        return twiml.fill(template, dish_name=self._describe_lines(lines, restaurant, final=", and "))
+
+    def _describe_lines(self, lines: List[OrderLine], restaurant: Restaurant, final: str = ", ") -> twiml.Markup:
+        prompts = get_menu_prompts(restaurant).items
+        parts = []
+        for line in lines:
+            item = prompts.get(line.item_id)
+            if item:
+                desc = item.describe(line.choices)
+                parts.append(f"{line.quantity} {desc}" if line.quantity > 1 else desc)
+        if len(parts) > 1:
+            return twiml.Markup(", ".join(parts[:-1]) + final + parts[-1])
+        return twiml.Markup("".join(parts))
+
+    def _clear_pending(self, ctx: CallContext):
+        ctx.pending_item_id = None
+        ctx.pending_choices = []
+        ctx.pending_quantity = 1
 
-    def _handle_selecting_variety(self, ctx: CallContext, text: str, restaurant: Restaurant, response: VoiceResponse, callback_url: str) -> str:
-        if not ctx.pending_item:
+    def _handle_selecting_variety(self, ctx: CallContext, text: str, restaurant: Restaurant, callback_url: str) -> str:
+        item = self._pending_item(ctx, restaurant)
+        if not item:
             ctx.stage = CallStage.ORDERING_ID
-            return self._respond(ctx, response, Prompts.SPECIFY_ID, callback_url)
+            return self._respond(ctx, Prompts.SPECIFY_ID, callback_url)
 
-        current_opt = ctx.pending_item.options[ctx.current_option_index]
+        option_index = next_option_index(ctx.pending_choices)
+        current_opt = item.options[option_index]
         
-        selected_choice = None
+        filled = False
         digits = "".join(re.findall(r"\d", text))
         
         if digits:
-            for c in current_opt.choices:
+            for idx, c in enumerate(current_opt.choices):
                 if c.id == digits[0]:
-                    selected_choice = c
+                    ctx.pending_choices[option_index] = idx
+                    filled = True
                     break
         else:
-            for c in current_opt.choices:
-                if c.name.lower() in text:
-                    selected_choice = c
-                    break
+            # Names can answer this question and the ones after it at once ("wide, and beef")
+            for i, choice in enumerate(match_choices(item, choice_words(text))):
+                if choice >= 0 and ctx.pending_choices[i] < 0:
+                    ctx.pending_choices[i] = choice
+                    filled = True
                     
-        if selected_choice:
-            ctx.pending_options.append(SelectedOption(
-                option_name=current_opt.name,
-                choice_name=selected_choice.name,
-                price_extra=selected_choice.price_extra
-            ))
-            
-            ctx.current_option_index += 1
-            if ctx.current_option_index < len(ctx.pending_item.options):
-                opt = ctx.pending_item.options[ctx.current_option_index]
-                options_list = ", ".join([f"{c.id} for {c.name}" for c in opt.choices])
-                msg = f"Next, for {ctx.pending_item.name}, {opt.name}? {options_list}"
-                self.save_context(ctx)
-                return self._respond(ctx, response, msg, callback_url)
+        if filled:
+            option_index = next_option_index(ctx.pending_choices)
+            if option_index < len(item.options):
+                return self._respond(ctx, get_menu_prompts(restaurant).get(item.id).option_prompts[option_index], callback_url)
             else:
-                ctx.stage = CallStage.CONFIRMING_ITEM
-                self.save_context(ctx)
-                options_str = " with " + ", ".join([o.choice_name for o in ctx.pending_options]) if ctx.pending_options else ""
-                msg = Prompts.CONFIRM_DISH_TEMPLATE.format(dish_name=f"{ctx.pending_item.name}{options_str}")
-                return self._respond(ctx, response, msg, callback_url)
+                ctx.batch.append(OrderLine(item.id, tuple(ctx.pending_choices), line_cents(item, ctx.pending_choices), ctx.pending_quantity))
+                self._clear_pending(ctx)
+                return self._next_pending(ctx, restaurant, callback_url)
         
-        return self._respond(ctx, response, Prompts.INVALID_SELECTION, callback_url)
+        return self._respond(ctx, Prompts.INVALID_SELECTION, callback_url)
 
-    def _handle_confirming_item(self, ctx: CallContext, text: str, restaurant: Restaurant, response: VoiceResponse, callback_url: str) -> str:
-        # Strict checking for 1 or 2 to avoid "20" matching "2"
-        digits = re.findall(r"\b\d\b", text) # Only single digits as whole words
-        
-        is_yes = "1" in digits or "yes" in text or "yeah" in text or "correct" in text
-        is_no = "2" in digits or "no" in text or "not" in text or "wrong" in text
-        
-        # Fallback if no single digit was found but "1" or "2" is the only thing said
-        if not digits:
-            if text.strip() == "1": is_yes = True
-            if text.strip() == "2": is_no = True
+    def _handle_confirming_item(self, ctx: CallContext, text: str, restaurant: Restaurant, callback_url: str) -> str:
+        intent = intents.classify(ctx.stage, text, restaurant).intent
         
-        if is_yes:
-            order_item = OrderItem(item=ctx.pending_item, selected_options=ctx.pending_options)
-            ctx.current_order.append(order_item)
+        if intent == Intent.YES:
+            if ctx.pending_item_id is not None:
+                # Session saved before batches existed: the dish is still in the pending slot
+                item = self._pending_item(ctx, restaurant)
+                if not item:
+                    raise ValueError(f"Pending item '{ctx.pending_item_id}' not on the menu")
+                ctx.batch.append(OrderLine(item.id, tuple(ctx.pending_choices), line_cents(item, ctx.pending_choices), ctx.pending_quantity))
+                self._clear_pending(ctx)
+            if not ctx.batch:
+                raise ValueError("Nothing pending to confirm")
             
-            added_name = ctx.pending_item.name
-            ctx.pending_item = None
-            ctx.pending_options = []
+            batch = ctx.batch
+            ctx.current_order.extend(batch)
+            ctx.batch = []
             ctx.stage = CallStage.ASK_ADD_MORE
-            self.save_context(ctx)
             
-            msg = Prompts.ADD_MORE.format(dish_name=added_name)
-            return self._respond(ctx, response, msg, callback_url)
+            return self._respond(ctx, self._batch_prompt(batch, restaurant, added=True), callback_url)
         
-        elif is_no:
-            ctx.pending_item = None
-            ctx.pending_options = []
+        elif intent == Intent.NO:
+            self._clear_pending(ctx)
+            ctx.queued_items = []
+            ctx.batch = []
             ctx.stage = CallStage.ORDERING_ID
-            self.save_context(ctx)
-            return self._respond(ctx, response, "Okay, let's try again. " + Prompts.SPECIFY_ID, callback_url)
+            return self._respond(ctx, "Okay, let's try again. " + Prompts.SPECIFY_ID, callback_url)
             
-        return self._respond(ctx, response, "I'm sorry, please say 1 for yes or 2 for no.", callback_url)
+        return self._respond(ctx, "I'm sorry, please say 1 for yes or 2 for no.", callback_url)
 
-    def _handle_ask_add_more(self, ctx: CallContext, text: str, restaurant: Restaurant, response: VoiceResponse, callback_url: str) -> str:
-        digits = re.findall(r"\b\d\b", text)
-        is_yes = "1" in digits or "yes" in text or "yeah" in text or "more" in text or "continue" in text
-        is_no = "2" in digits or "no" in text or "that's it" in text or "done" in text or "finished" in text or "enough" in text
-        
-        if not digits:
-            if text.strip() == "1": is_yes = True
-            if text.strip() == "2": is_no = True
+    def _handle_ask_add_more(self, ctx: CallContext, text: str, restaurant: Restaurant, callback_url: str) -> str:
+        intent = intents.classify(ctx.stage, text, restaurant).intent
         
-        if is_yes:
+        if intent == Intent.YES:
             ctx.stage = CallStage.ORDERING_ID
-            self.save_context(ctx)
-            return self._respond(ctx, response, "Great. " + Prompts.SPECIFY_ID, callback_url)
-        elif is_no:
+            return self._respond(ctx, "Great. " + Prompts.SPECIFY_ID, callback_url)
+        elif intent == Intent.DONE:
             ctx.stage = CallStage.CONFIRMING_ORDER
-            self.save_context(ctx)
             
-            summary, total = self._calc_summary(ctx)
-            msg = Prompts.SUMMARY_TEMPLATE.format(order_summary=summary, total_price=total)
-            return self._respond(ctx, response, msg, callback_url)
+            summary, total = self._calc_summary(ctx, restaurant)
+            msg = twiml.fill(Prompts.SUMMARY_TEMPLATE, order_summary=summary, total_price=total)
+            return self._respond(ctx, msg, callback_url)
             
-        item = find_item_by_id(text, restaurant)
-        if item:
-            return self._handle_ordering_id(ctx, text, restaurant, response, callback_url)
+        # A dish instead of yes/no: take it as the next order
+        if intent in (Intent.ITEM, Intent.UNKNOWN) and self._queue_items(ctx, text, restaurant):
+            return self._next_pending(ctx, restaurant, callback_url)
             
-        return self._respond(ctx, response, "Would you like to add more? Say 1 for yes or 2 for no.", callback_url)
+        return self._respond(ctx, "Would you like to add more? Say 1 for yes or 2 for no.", callback_url)
 
-    def _handle_confirming_order(self, ctx: CallContext, text: str, restaurant: Restaurant, response: VoiceResponse, callback_url: str) -> str:
-        digits = re.findall(r"\b\d\b", text)
-        is_yes = "1" in digits or "yes" in text or "place" in text or "confirm" in text
-        is_no = "2" in digits or "no" in text or "cancel" in text
-
-        if not digits:
-            if text.strip() == "1": is_yes = True
-            if text.strip() == "2": is_no = True
+    def _handle_confirming_order(self, ctx: CallContext, text: str, restaurant: Restaurant, callback_url: str) -> str:
+        intent = intents.classify(ctx.stage, text, restaurant).intent
         
-        if is_yes:
-            self._save_order_disk(ctx, restaurant)
+        if intent == Intent.YES:
+            self._save_order(ctx, restaurant)
             ctx.stage = CallStage.COMPLETED
-            self.save_context(ctx)
-            response.say(Prompts.FINAL_SUCCESS)
-            response.hangup()
-            return str(response)
-        elif is_no:
+            return twiml.hangup(Prompts.FINAL_SUCCESS)
+        elif intent == Intent.NO:
             ctx.stage = CallStage.COMPLETED
-            self.save_context(ctx)
-            response.say(Prompts.FINAL_CANCEL)
-            response.hangup()
-            return str(response)
+            return twiml.hangup(Prompts.FINAL_CANCEL)
             
-        return self._respond(ctx, response, "Please say 1 to confirm your order or 2 to cancel.", callback_url)
+        return self._respond(ctx, "Please say 1 to confirm your order or 2 to cancel.", callback_url)
 
-    def _save_order_disk(self, ctx: CallContext, restaurant: Restaurant):
-        if not os.path.exists("orders"):
-            os.makedirs("orders", exist_ok=True)
-            
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"orders/order_{timestamp}_{ctx.call_sid}.json"
-        
-        summary, total = self._calc_summary(ctx)
+    def _save_order(self, ctx: CallContext, restaurant: Restaurant):
+        now = datetime.datetime.now()
+        order_items = self._hydrate_order(ctx, restaurant)
+        total = sum(i.total_cents for i in order_items) / 100
         
         order_data = {
-            "order_id": f"ORD-{timestamp}",
+            "order_id": f"ORD-{now.strftime('%Y%m%d_%H%M%S')}",
             "call_sid": ctx.call_sid,
-            "timestamp": datetime.datetime.now().isoformat(),
+            "timestamp": now.isoformat(),
+            "restaurant_id": restaurant.id,
             "restaurant": restaurant.name,
             "items": [
                 {
                     "id": i.item.id,
                     "name": i.item.name,
                     "price": i.item.price,
+                    "quantity": i.quantity,
                     "options": [{"name": o.option_name, "choice": o.choice_name, "extra": o.price_extra} for o in i.selected_options],
                     "total": i.total_price
                 }
-                for i in ctx.current_order
+                for i in order_items
             ],
             "total_price": total,
             "status": "CONFIRMED"
         }
         
+        # Queued for the background writer; the caller does not wait on disk
         try:
-            with open(filename, "w") as f:
-                json.dump(order_data, f, indent=4)
+            self.orders.submit(order_data)
         except Exception as e:
             logger.error(f"Failed to save order: {e}")
 
-    def _respond(self, ctx: CallContext, response: VoiceResponse, text: str, callback_url: str) -> str:
+    def _respond(self, ctx: CallContext, text: str, callback_url: str, lead: str = "") -> str:
         # numDigits=2 for ORDERING_ID to be snappy with keypad
         num_digits = 2 if ctx.stage == CallStage.ORDERING_ID else 1
-        
-        gather = Gather(
-            input='speech dtmf', 
-            action=callback_url, 
-            numDigits=num_digits, 
-            speechTimeout='auto'
-        )
-        gather.say(text)
-        response.append(gather)
-        return str(response)
-
-    def _calc_summary(self, ctx: CallContext):
-        summary_parts = []
-        total = 0.0
-        for i in ctx.current_order:
-            opts = " with " + ", ".join([o.choice_name for o in i.selected_options]) if i.selected_options else ""
-            summary_parts.append(f"{i.item.name}{opts}")
-            total += i.total_price
-        return ", ".join(summary_parts), total
+        timeout = settings.STREAM_NO_INPUT_TIMEOUT if self.streaming else 0
+        return twiml.gather(text, callback_url, num_digits, lead=lead, timeout=timeout)
+
+    def _pending_item(self, ctx: CallContext, restaurant: Restaurant) -> Optional[MenuItem]:
+        if ctx.pending_item_id is None:
+            return None
+        return get_menu_index(restaurant).get(ctx.pending_item_id)
+
+    def _hydrate_order(self, ctx: CallContext, restaurant: Restaurant) -> List[OrderItem]:
+        index = get_menu_index(restaurant)
+        if ctx.menu_version and ctx.menu_version != index.version:
+            logger.warning(f"[_hydrate_order] Menu changed during call {ctx.call_sid} ({ctx.menu_version} -> {index.version})")
+        order_items = []
+        for line in ctx.current_order:
+            item = index.get(line.item_id)
+            if not item:
+                logger.error(f"[_hydrate_order] Item '{line.item_id}' is no longer on the menu")
+                continue
+            selected = [
+                SelectedOption(option_name=opt.name, choice_name=opt.choices[c].name, price_extra=opt.choices[c].price_extra)
+                for opt, c in zip(item.options, line.choices) if c >= 0
+            ]
+            order_items.append(OrderItem(item=item, selected_options=selected, quantity=line.quantity, total_cents=line.unit_cents * line.quantity))
+        return order_items
+
+    def _calc_summary(self, ctx: CallContext, restaurant: Restaurant):
+        total_cents = sum(line.unit_cents * line.quantity for line in ctx.current_order)
+        return self._describe_lines(ctx.current_order, restaurant), total_cents / 100
@@ -0,0 +1,113 @@
+import re
+import time
+import asyncio
+import logging
+from collections import Counter, defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional
+from ..core.config import settings
+from .metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+class Candidate(NamedTuple):
+    """One transcript of a caller's turn and where it came from."""
+    source: str
+    text: str
+    confidence: Optional[float] = None
+    no_speech: bool = False   # the source found no speech in the audio: the turn is silence
+
+def _normalize(text: str) -> str:
+    return " ".join(re.findall(r"[a-z0-9]+", text.lower()))
+
+class TranscriptionHedge:
+    """
+    Picks one transcript for a turn that several recognizers can transcribe. A fast candidate
+    (Twilio's SpeechResult, already in the webhook) is used at once if accept() says it answers the
+    question. Otherwise the racers run in parallel: the first usable transcript, or a racer finding
+    no speech in the recording at all, wins and the rest are cancelled. At HEDGE_DEADLINE, or when all have answered without one usable, the transcript most
+    candidates agree on wins, then the most confident.
+    """
+    def __init__(self, deadline: Optional[float] = None, default_confidence: Optional[float] = None):
+        self.deadline = settings.HEDGE_DEADLINE if deadline is None else deadline
+        self.default_confidence = settings.HEDGE_DEFAULT_CONFIDENCE if default_confidence is None else default_confidence
+        # Per source: seconds from the start of the race to its transcript
+        self.latency: Dict[str, Histogram] = defaultdict(Histogram)
+        self.counts: Dict[str, Counter] = defaultdict(Counter)
+
+    async def pick(self, fast: Optional[Candidate], racers: Dict[str, Callable[[], Awaitable[Candidate]]],
+                   accept: Callable[[str], Awaitable[bool]]) -> Optional[Candidate]:
+        candidates: List[Candidate] = []
+        if fast and fast.text:
+            self.counts[fast.source]["runs"] += 1
+            if await accept(fast.text):
+                self.counts[fast.source]["wins"] += 1
+                return fast
+            candidates.append(fast)
+
+        started = time.perf_counter()
+        tasks = {asyncio.ensure_future(racer()): name for name, racer in racers.items()}
+        pending = set(tasks)
+        winner = None
+        try:
+            while pending and winner is None:
+                remaining = started + self.deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = tasks[task]
+                    self.counts[name]["runs"] += 1
+                    self.latency[name].observe(time.perf_counter() - started)
+                    try:
+                        candidate = task.result()
+                    except Exception as e:
+                        self.counts[name]["failed"] += 1
+                        logger.error(f"[TranscriptionHedge] {name} failed: {e}")
+                        continue
+                    if candidate.no_speech:
+                        # The recording outranks a guess that did not parse: nobody spoke
+                        winner = winner or candidate
+                        continue
+                    if not candidate.text:
+                        continue
+                    candidates.append(candidate)
+                    if winner is None and await accept(candidate.text):
+                        winner = candidate
+        finally:
+            for task in pending:
+                task.cancel()
+                self.counts[tasks[task]]["runs"] += 1
+                self.counts[tasks[task]]["cancelled"] += 1
+
+        if winner is None:
+            winner = self._choose(candidates)
+        if winner:
+            self.counts[winner.source]["wins"] += 1
+            logger.info(f"[TranscriptionHedge] {winner.source} won of {len(candidates)} transcripts: "
+                        f"{'no speech' if winner.no_speech else repr(winner.text)}")
+        return winner
+
+    def _choose(self, candidates: List[Candidate]) -> Optional[Candidate]:
+        if not candidates:
+            return None
+        votes = Counter(_normalize(c.text) for c in candidates)
+        return max(candidates, key=lambda c: (
+            votes[_normalize(c.text)],
+            self.default_confidence if c.confidence is None else c.confidence,
+        ))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            name: {
+                "runs": counts["runs"],
+                "wins": counts["wins"],
+                "cancelled": counts["cancelled"],
+                "failed": counts["failed"],
+                "win_rate": round(counts["wins"] / counts["runs"], 4) if counts["runs"] else None,
+                "seconds": self.latency[name].snapshot() if name in self.latency else None,
+            }
+            for name, counts in self.counts.items()
+        }
+
+# Global instance
+hedge = TranscriptionHedge()
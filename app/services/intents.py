@@ -0,0 +1,168 @@
+import re
+import logging
+from enum import Enum
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+from ..models.database import Restaurant
+
+logger = logging.getLogger(__name__)
+
+class Intent(str, Enum):
+    YES = "yes"
+    NO = "no"
+    DONE = "done"
+    ITEM = "item"
+    UNKNOWN = "unknown"
+
+class IntentResult(NamedTuple):
+    intent: Intent
+    confidence: float
+
+# Stages that ask a yes/no question (FlowManager's CallStage values)
+CONFIRM_ITEM = "CONFIRMING_ITEM"
+ADD_MORE = "ASK_ADD_MORE"
+CONFIRM_ORDER = "CONFIRMING_ORDER"
+
+# Phrases per stage and intent. Matching is on whole tokens, so "no" never fires inside
+# "I know", "nothing" or "another". Longer phrases win over the words inside them.
+DEFAULT_VOCABULARY: Dict[str, Dict[Intent, List[str]]] = {
+    CONFIRM_ITEM: {
+        Intent.YES: ["1", "one", "yes", "yeah", "yep", "yup", "correct", "right", "sure", "ok", "okay",
+                     "that's right", "that is right", "that's correct", "no problem"],
+        Intent.NO: ["2", "two", "no", "nope", "not", "wrong", "incorrect", "not right", "not correct",
+                    "that's wrong", "nah"],
+    },
+    ADD_MORE: {
+        Intent.YES: ["1", "one", "yes", "yeah", "yep", "sure", "more", "continue", "another", "one more",
+                     "something else", "add", "not yet", "not done", "not finished"],
+        Intent.DONE: ["2", "two", "no", "nope", "not", "wrong", "done", "finished", "enough", "nothing",
+                      "nothing else", "that's it", "that is it", "that's all", "that is all", "i'm good",
+                      "im good", "all set", "no thanks", "no thank you", "not really"],
+    },
+    CONFIRM_ORDER: {
+        Intent.YES: ["1", "one", "yes", "yeah", "yep", "sure", "place", "confirm", "go ahead",
+                     "place it", "place the order", "no problem"],
+        Intent.NO: ["2", "two", "no", "nope", "not", "wrong", "cancel", "don't", "do not", "nah",
+                    "don't place it", "do not place it"],
+    },
+}
+
+# Words that carry no intent; they only dilute confidence a little less than unknown words
+FILLER = {
+    "a", "the", "uh", "um", "oh", "please", "thanks", "thank", "you", "i", "it", "is", "that",
+    "that's", "and", "so", "well", "just", "order", "my", "for", "now",
+}
+
+# A number other than the 1/2 choice keys means the caller named a dish instead of answering
+NUMBER_WORDS = {
+    "zero", "three", "four", "five", "six", "seven", "eight", "nine", "ten", "eleven", "twelve",
+    "thirteen", "fourteen", "fifteen", "sixteen", "seventeen", "eighteen", "nineteen", "twenty",
+    "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety",
+}
+
+# The keypad answers. Spoken, they also turn up inside other replies ("not that one"),
+# so they only decide the intent when no keyword does.
+CHOICE_KEYS = {"1", "2", "one", "two"}
+
+# Next to a choice key these make it a count or a negation ("two more", "add 2 more", "never one"),
+# not an answer: with no keyword to go on, the reply is unknown
+KEY_MODIFIERS = {"not", "no", "never", "don't", "dont", "wrong", "more", "add", "another", "extra", "other"}
+KEY_MODIFIER_SPAN = 2   # tokens either side of the key
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+def intent_tokens(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower().replace("’", "'"))
+
+class IntentClassifier:
+    """
+    Token-set intent matcher for one stage. Phrases are compiled into a map from first token
+    to candidate token tuples (longest first), so classification is one left-to-right pass.
+    """
+    def __init__(self, vocabulary: Dict[Intent, Iterable[str]], allow_items: bool = False):
+        self.allow_items = allow_items
+        self.phrases: Dict[str, List[Tuple[Tuple[str, ...], Intent]]] = {}
+        for intent, phrases in vocabulary.items():
+            for phrase in phrases:
+                toks = tuple(intent_tokens(phrase))
+                if toks:
+                    self.phrases.setdefault(toks[0], []).append((toks, intent))
+        for candidates in self.phrases.values():
+            candidates.sort(key=lambda c: -len(c[0]))
+
+    def classify(self, text: str) -> IntentResult:
+        tokens = intent_tokens(text)
+        if not tokens:
+            return IntentResult(Intent.UNKNOWN, 0.0)
+
+        hits: Dict[Intent, int] = {}
+        key_hits: Dict[Intent, int] = {}
+        key_positions: List[int] = []
+        matched = filler = 0
+        number = False
+        i = 0
+        while i < len(tokens):
+            tok = tokens[i]
+            for phrase, intent in self.phrases.get(tok, ()):
+                if tuple(tokens[i:i + len(phrase)]) == phrase:
+                    if len(phrase) == 1 and tok in CHOICE_KEYS:
+                        key_hits[intent] = key_hits.get(intent, 0) + 1
+                        key_positions.append(i)
+                    else:
+                        hits[intent] = hits.get(intent, 0) + 1
+                    matched += len(phrase)
+                    i += len(phrase)
+                    break
+            else:
+                if tok in FILLER:
+                    filler += 1
+                elif tok in NUMBER_WORDS or (tok.isdigit() and tok not in ("1", "2")):
+                    number = True
+                i += 1
+
+        if self.allow_items and number:
+            return IntentResult(Intent.ITEM, 0.9 if not hits else 0.6)
+        if not hits:
+            if any(tok in KEY_MODIFIERS for pos in key_positions
+                   for tok in tokens[max(0, pos - KEY_MODIFIER_SPAN):pos + KEY_MODIFIER_SPAN + 1]):
+                return IntentResult(Intent.UNKNOWN, 0.0)
+            hits = key_hits
+        if len(hits) != 1:
+            # Nothing recognised, or contradictory answers ("yes no"): ask again
+            return IntentResult(Intent.UNKNOWN, 0.0)
+
+        intent = next(iter(hits))
+        unknown = len(tokens) - matched - filler
+        confidence = (matched + 0.5 * filler) / (matched + 0.5 * filler + unknown)
+        return IntentResult(intent, round(0.5 + 0.5 * confidence, 3))
+
+def _merge(base: Dict[Intent, List[str]], extra: Dict[str, List[str]]) -> Dict[Intent, List[str]]:
+    merged = {intent: list(phrases) for intent, phrases in base.items()}
+    for intent, phrases in extra.items():
+        merged.setdefault(Intent(intent), []).extend(phrases)
+    return merged
+
+class IntentEngine:
+    """Compiled classifiers per (tenant, stage); tenants can add phrases via Restaurant.intent_vocabulary."""
+    def __init__(self):
+        self.default = {stage: IntentClassifier(vocab, allow_items=stage == ADD_MORE) for stage, vocab in DEFAULT_VOCABULARY.items()}
+        self._tenants: Dict[str, Tuple[dict, Dict[str, IntentClassifier]]] = {}
+
+    def _classifiers(self, restaurant: Restaurant) -> Dict[str, IntentClassifier]:
+        extra = restaurant.intent_vocabulary
+        if not extra:
+            return self.default
+        cached = self._tenants.get(restaurant.id)
+        if cached is None or cached[0] is not extra:
+            classifiers = {
+                stage: IntentClassifier(_merge(vocab, extra.get(stage, {})), allow_items=stage == ADD_MORE)
+                for stage, vocab in DEFAULT_VOCABULARY.items()
+            }
+            cached = (extra, classifiers)
+            self._tenants[restaurant.id] = cached
+        return cached[1]
+
+    def classify(self, stage: str, text: str, restaurant: Restaurant) -> IntentResult:
+        return self._classifiers(restaurant)[stage].classify(text)
+
+# Global instance
+intents = IntentEngine()
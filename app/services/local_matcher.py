@@ -0,0 +1,258 @@
+import re
+import logging
+from typing import List, Optional, Dict, Set, Tuple
+from ..models.database import Restaurant, MenuItem
+
+logger = logging.getLogger(__name__)
+
+# Filler words callers wrap around a dish name; they carry no matching signal
+STOPWORDS = {
+    "a", "an", "and", "the", "i", "i'd", "id", "i'll", "ill", "want", "would", "like", "please",
+    "can", "could", "get", "have", "order", "some", "one", "of", "me", "give", "let", "lets",
+    "um", "uh", "yeah", "okay", "ok", "to", "for", "with", "w", "in", "on", "number", "pcs",
+}
+
+_WORD_RE = re.compile(r"[a-z]+")
+_PAREN_RE = re.compile(r"\([^)]*\)")
+
+VOWELS = set("aeiou")
+FRONT_VOWELS = set("eiy")
+
+def normalize_words(text: str) -> List[str]:
+    """Lowercases, drops parentheticals like "(8pcs)" and filler words."""
+    text = _PAREN_RE.sub(" ", text.lower())
+    return [w for w in _WORD_RE.findall(text) if w not in STOPWORDS]
+
+def phonetic_key(word: str) -> str:
+    """
+    Metaphone-style sound key. Consonant clusters collapse to one symbol, vowels are
+    dropped after the first letter and R after a vowel is dropped, so that common
+    phone-line STT confusions ("poke"/"pork", "chow"/"chao", "kong"/"kung") share a key.
+    """
+    w = "".join(ch for ch in word.lower() if ch.isalpha())
+    if not w:
+        return ""
+    for prefix in ("kn", "gn", "pn", "wr", "ae"):
+        if w.startswith(prefix):
+            w = w[1:]
+            break
+    if w.startswith("x"):
+        w = "s" + w[1:]
+    elif w.startswith("wh"):
+        w = "w" + w[2:]
+
+    key: List[str] = []
+    n = len(w)
+    i = 0
+    while i < n:
+        c = w[i]
+        nxt = w[i + 1] if i + 1 < n else ""
+        prev = w[i - 1] if i > 0 else ""
+        code = ""
+        step = 1
+
+        if c in VOWELS:
+            code = "A" if i == 0 else ""
+        elif c == "b":
+            code = "" if prev == "m" and i == n - 1 else "P"
+        elif c == "c":
+            if nxt == "h":
+                code, step = "X", 2
+            elif nxt in FRONT_VOWELS:
+                code = "S"
+            elif nxt == "k":
+                code, step = "K", 2
+            else:
+                code = "K"
+        elif c == "d":
+            if nxt == "g" and i + 2 < n and w[i + 2] in FRONT_VOWELS:
+                code, step = "J", 3
+            else:
+                code = "T"
+        elif c == "g":
+            if nxt == "h":
+                code, step = ("K" if i == 0 else ""), 2
+            elif nxt in FRONT_VOWELS:
+                code = "J"
+            else:
+                code = "K"
+        elif c == "h":
+            code = "H" if nxt in VOWELS and prev not in set("cgpst") else ""
+        elif c == "k":
+            code = "" if prev == "c" else "K"
+        elif c == "p":
+            code, step = ("F", 2) if nxt == "h" else ("P", 1)
+        elif c == "q":
+            code = "K"
+        elif c == "r":
+            code = "" if prev in VOWELS and nxt not in VOWELS else "R"
+        elif c == "s":
+            if nxt == "h":
+                code, step = "X", 2
+            else:
+                code = "S"
+        elif c == "t":
+            if nxt == "h":
+                code, step = "0", 2
+            elif nxt == "c" and i + 2 < n and w[i + 2] == "h":
+                code = ""
+            else:
+                code = "T"
+        elif c == "v":
+            code = "F"
+        elif c in ("w", "y"):
+            code = c.upper() if nxt in VOWELS else ""
+        elif c == "x":
+            code = "KS"
+        elif c == "z":
+            code = "S"
+        else:
+            code = c.upper()
+
+        if code and not (key and key[-1] == code):
+            key.append(code)
+        i += step
+    return "".join(key)
+
+def trigrams(word: str) -> Set[str]:
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def edit_distance(a: str, b: str) -> int:
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return prev[-1]
+
+def word_similarity(a: str, b: str, key_a: str, key_b: str) -> float:
+    """0..1 similarity of two words, from spelling and sound."""
+    if a == b:
+        return 1.0
+    spelled = 1.0 - edit_distance(a, b) / max(len(a), len(b))
+    if key_a and key_a == key_b:
+        return max(spelled, 0.9)
+    return spelled
+
+class LocalMatcher:
+    """
+    In-process fuzzy/phonetic matcher for one menu, built once per menu.
+    Each spoken word is compared only against the menu vocabulary words that share a
+    trigram or a sound key with it; dishes are then scored by how well the spoken words
+    and the dish name words cover each other.
+    """
+    MIN_WORD_SIMILARITY = 0.6
+    AMBIGUITY_MARGIN = 0.05
+
+    def __init__(self, menu: List[MenuItem]):
+        self.menu = menu
+        self.words: List[List[str]] = []
+        # Whole-name sound key catches split/joined compounds ("chow mein" vs "ChaoMian")
+        self.compact_keys: List[str] = []
+        self.vocab: Dict[str, str] = {}
+        self.word_items: Dict[str, Set[int]] = {}
+        self.by_trigram: Dict[str, Set[str]] = {}
+        self.by_key: Dict[str, Set[str]] = {}
+
+        for pos, item in enumerate(menu):
+            words = normalize_words(item.name)
+            self.words.append(words)
+            self.compact_keys.append(phonetic_key("".join(words)))
+            for w in words:
+                self.word_items.setdefault(w, set()).add(pos)
+                if w in self.vocab:
+                    continue
+                key = phonetic_key(w)
+                self.vocab[w] = key
+                for tri in trigrams(w):
+                    self.by_trigram.setdefault(tri, set()).add(w)
+                if key:
+                    self.by_key.setdefault(key, set()).add(w)
+
+    def _similarities(self, spoken: List[str]) -> Dict[str, Dict[str, float]]:
+        """spoken word -> {menu word: similarity} for the menu words worth comparing."""
+        sims: Dict[str, Dict[str, float]] = {}
+        for s in spoken:
+            if s in sims:
+                continue
+            key = phonetic_key(s)
+            near = set(self.by_key.get(key, ()))
+            for tri in trigrams(s):
+                near.update(self.by_trigram.get(tri, ()))
+            row = {}
+            for w in near:
+                sim = word_similarity(s, w, key, self.vocab[w])
+                if sim >= self.MIN_WORD_SIMILARITY:
+                    row[w] = sim
+            sims[s] = row
+        return sims
+
+    def _score(self, spoken: List[str], name_words: List[str], sims: Dict[str, Dict[str, float]]) -> float:
+        if not name_words:
+            return 0.0
+        # recall: how much of the dish name was said; precision: how much of what was said is the dish
+        recall = sum(max(sims[s].get(n, 0.0) for s in spoken) for n in name_words) / len(name_words)
+        precision = sum(max((sims[s].get(n, 0.0) for n in name_words), default=0.0) for s in spoken) / len(spoken)
+        if recall + precision == 0:
+            return 0.0
+        return 2 * recall * precision / (recall + precision)
+
+    def _scores(self, spoken: List[str]) -> List[Tuple[int, float]]:
+        """(menu position, score) for every dish sharing at least one near word with the speech."""
+        sims = self._similarities(spoken)
+        candidates: Set[int] = set()
+        for row in sims.values():
+            for w in row:
+                candidates.update(self.word_items[w])
+
+        compact_key = phonetic_key("".join(spoken))
+        scores = []
+        for pos in sorted(candidates):
+            score = self._score(spoken, self.words[pos], sims)
+            if compact_key and compact_key == self.compact_keys[pos]:
+                score = max(score, 0.9)
+            scores.append((pos, score))
+        return scores
+
+    def match(self, speech_text: str) -> Tuple[Optional[MenuItem], float]:
+        """Returns the best item and a 0..1 confidence, or (None, 0.0)."""
+        spoken = normalize_words(speech_text)
+        if not spoken:
+            return None, 0.0
+
+        best_pos, best, second = -1, 0.0, 0.0
+        for pos, score in self._scores(spoken):
+            if score > best:
+                best_pos, best, second = pos, score, best
+            elif score > second:
+                second = score
+
+        if best_pos < 0:
+            return None, 0.0
+        # Two dishes that fit about equally well ("chicken") are not a confident match
+        confidence = best - max(0.0, self.AMBIGUITY_MARGIN - (best - second))
+        return self.menu[best_pos], round(confidence, 3)
+
+    def shortlist(self, speech_text: str, limit: int) -> List[MenuItem]:
+        """Up to `limit` best scoring items, in menu order. Empty if nothing is close."""
+        spoken = normalize_words(speech_text)
+        if not spoken:
+            return []
+        ranked = sorted(self._scores(spoken), key=lambda ps: -ps[1])[:limit]
+        return [self.menu[pos] for pos, _ in sorted(ranked)]
+
+_local_matchers: Dict[str, LocalMatcher] = {}
+
+def get_local_matcher(restaurant: Restaurant) -> LocalMatcher:
+    """Returns the cached matcher for the restaurant, rebuilding it if its menu was replaced."""
+    lm = _local_matchers.get(restaurant.id)
+    if lm is None or lm.menu is not restaurant.menu:
+        lm = LocalMatcher(restaurant.menu)
+        _local_matchers[restaurant.id] = lm
+    return lm
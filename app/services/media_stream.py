@@ -0,0 +1,171 @@
+import json
+import time
+import asyncio
+import logging
+from typing import AsyncIterator, Callable, Optional
+from starlette.concurrency import run_in_threadpool
+from ..core.config import settings
+from ..models.database import Restaurant, get_restaurant_by_phone
+from .flow_manager import FlowManager, CallStage
+from .media_ingest import MediaIngest
+from .audio import VoiceActivity
+from .metrics import Histogram
+from .stt.base import STTProvider, Transcript
+
+logger = logging.getLogger(__name__)
+
+# From a transcript being usable to the reply being handed to Twilio
+turn_latency = Histogram()
+
+_twilio_client = None
+
+def update_call(call_sid: str, twiml: str):
+    """Replaces the TwiML a live call is running, cutting off the prompt being spoken or waited on."""
+    global _twilio_client
+    if _twilio_client is None:
+        from twilio.rest import Client
+        _twilio_client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+    _twilio_client.calls(call_sid).update(twiml=twiml)
+
+class MediaStreamCall:
+    """
+    One Twilio Media Stream (<Start><Stream>, the caller's audio only) for the length of a call.
+    Audio goes to the STT provider. A final transcript, or an interim one that has stayed unchanged
+    for STREAM_PARTIAL_HOLD seconds (or until the caller pauses, by local VAD) and already answers
+    the current question, is one FlowManager turn; the reply replaces the call's TwiML over the REST API, so nothing waits on <Gather>.
+    Keypad input and silence still arrive on /voice/input through the keypad-only <Gather>.
+    """
+    def __init__(self, flow_manager: FlowManager, provider: STTProvider,
+                 update: Callable[[str, str], None] = update_call, hold: Optional[float] = None):
+        self.flow_manager = flow_manager
+        self.provider = provider
+        self.update = update
+        self.hold = settings.STREAM_PARTIAL_HOLD if hold is None else hold
+        self.call_sid: Optional[str] = None
+        self.restaurant: Optional[Restaurant] = None
+        self.callback_url = ""
+        self.finished = False
+        # The utterance being recognized already drove a turn from an interim result
+        self._consumed = False
+        self._settle: Optional[asyncio.Task] = None
+        self._turn_lock = asyncio.Lock()
+        # Set while the caller is quiet after speaking
+        self._pause = asyncio.Event()
+
+    async def run(self, websocket):
+        audio: asyncio.Queue = asyncio.Queue()
+        if not await self._wait_start(websocket):
+            return
+        reader = asyncio.create_task(self._read(websocket, audio))
+        try:
+            async for transcript in self.provider.recognize(self._chunks(audio)):
+                await self._on_transcript(transcript)
+                if self.finished:
+                    break
+        except Exception as e:
+            logger.error(f"[MediaStreamCall] Recognition failed for {self.call_sid}: {e}")
+        finally:
+            reader.cancel()
+            if self._settle:
+                self._settle.cancel()
+
+    async def _wait_start(self, websocket) -> bool:
+        """Reads up to the "start" event, which names the call and carries our <Parameter>s."""
+        async for message in websocket.iter_text():
+            data = json.loads(message)
+            if data.get("event") == "start":
+                start = data["start"]
+                params = start.get("customParameters", {})
+                self.call_sid = start["callSid"]
+                self.callback_url = params.get("callback", "")
+                self.restaurant = get_restaurant_by_phone(params.get("To", ""))
+                if not self.restaurant:
+                    logger.warning(f"[MediaStreamCall] No restaurant for stream of {self.call_sid}")
+                    return False
+                logger.info(f"[MediaStreamCall] Stream started for {self.call_sid}")
+                return True
+            if data.get("event") == "stop":
+                return False
+        return False
+
+    async def _read(self, websocket, audio: asyncio.Queue):
+        ingest = MediaIngest()
+        vad = VoiceActivity(settings.STREAM_END_SILENCE_MS, settings.VAD_MIN_DBFS) if settings.VAD_ENABLED else None
+        try:
+            async for message in websocket.iter_text():
+                if ingest.add(message):
+                    chunk = ingest.take()
+                    while chunk is not None:
+                        audio.put_nowait(chunk)
+                        if vad:
+                            vad.update(chunk)
+                            if vad.paused:
+                                self._pause.set()
+                            else:
+                                self._pause.clear()
+                        chunk = ingest.take()
+                elif json.loads(message).get("event") == "stop":
+                    break
+        except Exception as e:
+            logger.info(f"[MediaStreamCall] Stream closed for {self.call_sid}: {e}")
+        finally:
+            rest = ingest.flush()
+            if rest:
+                audio.put_nowait(rest)
+            audio.put_nowait(None)
+            if ingest.lost or ingest.late or ingest.overruns:
+                logger.warning(f"[MediaStreamCall] Stream of {self.call_sid}: {ingest.stats()}")
+
+    async def _chunks(self, audio: asyncio.Queue) -> AsyncIterator[bytes]:
+        while True:
+            chunk = await audio.get()
+            if chunk is None:
+                return
+            yield chunk
+
+    async def _on_transcript(self, transcript: Transcript):
+        text = transcript.text.strip()
+        if self._settle:
+            self._settle.cancel()
+            self._settle = None
+        if transcript.is_final:
+            consumed, self._consumed = self._consumed, False
+            if text and not consumed:
+                await self._turn(text, time.perf_counter())
+        elif text and not self._consumed:
+            self._settle = asyncio.create_task(self._settle_partial(text))
+
+    async def _settle_partial(self, text: str):
+        """Early endpointing: act on an interim transcript once it has held still and is a complete answer."""
+        try:
+            await asyncio.wait_for(self._pause.wait(), self.hold)
+        except asyncio.TimeoutError:
+            pass
+        ready = time.perf_counter()
+        if not await run_in_threadpool(self.flow_manager.is_complete, self.call_sid, text, self.restaurant):
+            return
+        # From here the turn must not be cancelled by the next transcript
+        self._settle = None
+        self._consumed = True
+        logger.info(f"[MediaStreamCall] Acting on interim transcript for {self.call_sid}: '{text}'")
+        await self._turn(text, ready)
+
+    async def _turn(self, text: str, ready: float):
+        async with self._turn_lock:
+            if self.finished:
+                return
+            response, done = await run_in_threadpool(self._process, text)
+            try:
+                await run_in_threadpool(self.update, self.call_sid, response)
+            except Exception as e:
+                # The turn is saved; the next keypress or silence timeout moves the call on from there
+                logger.error(f"[MediaStreamCall] Could not update call {self.call_sid}: {e}")
+                return
+            turn_latency.observe(time.perf_counter() - ready)
+            self.finished = done
+
+    def _process(self, text: str):
+        """Runs in the threadpool: the turn, and whether it ended the call (the store may be Redis)."""
+        response = self.flow_manager.process_input(self.call_sid, text, self.restaurant, self.callback_url)
+        ctx = self.flow_manager.store.get(self.call_sid)
+        return response, ctx is None or ctx.stage == CallStage.COMPLETED
@@ -1,83 +1,130 @@
 import json
 import logging
-from openai import OpenAI
-from typing import Optional, List, Dict
-from ..models.database import Restaurant, MenuItem
+from typing import Optional, List, Dict, Tuple
+from ..models.database import Restaurant, MenuItem, get_menu_index, tokenize
 from ..core.config import settings
+from .local_matcher import get_local_matcher
+from .cache import LRUCache
 
 logger = logging.getLogger(__name__)
 
+SYSTEM_PROMPT = (
+    "You are an intelligent order matching assistant for a restaurant.\n"
+    "Your goal is to match the user's spoken request to a specific valid Item ID from the provided menu.\n"
+    "Rules:\n"
+    "1. Return ONLY a JSON object: {\"item_id\": \"matched_id_or_null\", \"confidence\": 0.0_to_1.0, \"reasoning\": \"brief explanation\"}\n"
+    "2. Be helpful: Speech-to-text often makes phonetic mistakes (e.g., 'read' instead of 'sweet', 'poke' instead of 'pork').\n"
+    "3. Match based on the most likely intended menu item even if there are typos.\n"
+    "4. If it's truly impossible to tell what they want, return null."
+)
+
+def render_menu(items: List[MenuItem]) -> str:
+    # Condensed to save tokens/latency. Format: "id: Name (Category)"
+    return "\n".join(f"{item.id}: {item.name} ({item.category})" for item in items)
+
 class MenuMatcher:
     def __init__(self):
         self.api_key = settings.OPENAI_API_KEY
-        if self.api_key:
-            self.client = OpenAI(api_key=self.api_key)
-        else:
-            self.client = None
+        self._client = None
+        if not self.api_key:
             logger.warning("OPENAI_API_KEY not set. MenuMatcher will not work.")
 
+        # (restaurant_id, menu_version, normalized speech) -> item_id or None
+        self.cache = LRUCache(maxsize=settings.MATCH_CACHE_SIZE, ttl=settings.MATCH_CACHE_TTL)
+        self._menu_versions: Dict[str, str] = {}
+        # restaurant_id -> (menu_version, rendered system prompt)
+        self._prompts: Dict[str, Tuple[str, str]] = {}
+
+    @property
+    def client(self):
+        """The OpenAI client, created (and the SDK imported) on first use; None without an API key."""
+        if self._client is None and self.api_key:
+            from openai import OpenAI
+            self._client = OpenAI(api_key=self.api_key)
+        return self._client
+
     def match_item(self, speech_text: str, restaurant: Restaurant) -> Optional[MenuItem]:
         """
-        Uses LLM to find the best matching menu item for the given speech.
+        Finds the best matching menu item for the given speech.
+        A local fuzzy/phonetic match is tried first; the LLM is only asked when it is not confident.
         """
+        item, confidence = get_local_matcher(restaurant).match(speech_text)
+        if item and confidence >= settings.LOCAL_MATCH_THRESHOLD:
+            logger.info(f"Local Match: '{speech_text}' -> {item.id} ({confidence})")
+            return item
+
         if not self.client:
             return None
 
-        # 1. Prepare Menu Context (Condensed to save tokens/latency)
-        # Format: "id: Name (Category)"
-        menu_lines = []
-        for item in restaurant.menu:
-            menu_lines.append(f"{item.id}: {item.name} ({item.category})")
-        
-        menu_context = "\n".join(menu_lines)
-
-        # 2. System Prompt
-        system_prompt = (
-            "You are an intelligent order matching assistant for a restaurant.\n"
-            "Your goal is to match the user's spoken request to a specific valid Item ID from the provided menu.\n"
-            "Rules:\n"
-            "1. Return ONLY a JSON object: {\"item_id\": \"matched_id_or_null\", \"confidence\": 0.0_to_1.0, \"reasoning\": \"brief explanation\"}\n"
-            "2. Be helpful: Speech-to-text often makes phonetic mistakes (e.g., 'read' instead of 'sweet', 'poke' instead of 'pork').\n"
-            "3. Match based on the most likely intended menu item even if there are typos.\n"
-            "4. If it's truly impossible to tell what they want, return null."
-        )
+        index = get_menu_index(restaurant)
+        self._check_menu_version(restaurant.id, index.version)
+        key = (restaurant.id, index.version, " ".join(tokenize(speech_text)))
 
-        user_prompt = (
-            f"Menu:\n{menu_context}\n\n"
-            f"User Speech: \"{speech_text}\"\n\n"
-            "Match:"
-        )
+        hit, matched_id = self.cache.get(key)
+        if not hit:
+            try:
+                matched_id = self._match_llm(speech_text, restaurant, index.version)
+            except Exception as e:
+                logger.error(f"MenuMatcher NLU Error: {e}")
+                return None
+            self.cache.set(key, matched_id)
 
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o", # More powerful reasoning for phone speech typos
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                response_format={"type": "json_object"},
-                temperature=0.0
-            )
-            
-            content = response.choices[0].message.content
-            data = json.loads(content)
-            
-            matched_id = data.get("item_id")
-            confidence = data.get("confidence", 0)
-            
-            logger.info(f"NLU Match: {data}")
-            
-            if matched_id and confidence > 0.6: # Threshold
-                 # Find the actual item object
-                 for item in restaurant.menu:
-                     if item.id == matched_id:
-                         return item
-                         
-            return None
+        return index.get(matched_id) if matched_id else None
 
-        except Exception as e:
-            logger.error(f"MenuMatcher NLU Error: {e}")
-            return None
+    def _check_menu_version(self, restaurant_id: str, version: str):
+        """Drops cached matches for a restaurant as soon as its menu changes."""
+        if self._menu_versions.get(restaurant_id) != version:
+            if restaurant_id in self._menu_versions:
+                dropped = self.cache.invalidate(lambda k: k[0] == restaurant_id)
+                logger.info(f"Menu changed for {restaurant_id}, dropped {dropped} cached matches.")
+                self._prompts.pop(restaurant_id, None)
+            self._menu_versions[restaurant_id] = version
+
+    def _menu_prompt(self, restaurant: Restaurant, version: str) -> str:
+        """System prompt with the full menu, rendered once per restaurant and menu version."""
+        cached = self._prompts.get(restaurant.id)
+        if cached and cached[0] == version:
+            return cached[1]
+        prompt = f"{SYSTEM_PROMPT}\n\nMenu:\n{render_menu(restaurant.menu)}"
+        self._prompts[restaurant.id] = (version, prompt)
+        return prompt
+
+    def _match_llm(self, speech_text: str, restaurant: Restaurant, version: str) -> Optional[str]:
+        """Asks the LLM for an item ID. Returns None when it is not confident."""
+        # The system message is byte-identical across calls for the same menu, so the
+        # provider can reuse its cached prefix; only the short user turn changes.
+        shortlist = []
+        if settings.MATCH_PROMPT_CANDIDATES > 0:
+            shortlist = get_local_matcher(restaurant).shortlist(speech_text, settings.MATCH_PROMPT_CANDIDATES)
+
+        if shortlist:
+            system_prompt = SYSTEM_PROMPT
+            user_prompt = f"Menu:\n{render_menu(shortlist)}\n\nUser Speech: \"{speech_text}\"\n\nMatch:"
+        else:
+            system_prompt = self._menu_prompt(restaurant, version)
+            user_prompt = f"User Speech: \"{speech_text}\"\n\nMatch:"
+
+        response = self.client.chat.completions.create(
+            model="gpt-4o", # More powerful reasoning for phone speech typos
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            response_format={"type": "json_object"},
+            temperature=0.0
+        )
+        
+        content = response.choices[0].message.content
+        data = json.loads(content)
+        
+        matched_id = data.get("item_id")
+        confidence = data.get("confidence", 0)
+        
+        logger.info(f"NLU Match: {data}")
+        
+        if matched_id and confidence > 0.6: # Threshold
+            return str(matched_id)
+        return None
 
 # Global Instance
 matcher = MenuMatcher()
@@ -0,0 +1,48 @@
+import bisect
+import threading
+from typing import Any, Dict, List, Optional
+
+# Seconds; covers everything from a warm keep-alive fetch to a slow upstream
+DEFAULT_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+
+class Histogram:
+    """Thread-safe fixed-bucket latency histogram (Prometheus-style upper bounds, in seconds)."""
+    def __init__(self, buckets: Optional[List[float]] = None):
+        self.buckets = sorted(buckets or DEFAULT_BUCKETS)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+            self._count += 1
+
+    def _quantile(self, q: float) -> Any:
+        """Upper bound of the bucket holding the q-quantile ("+Inf" past the last bucket)."""
+        if not self._count:
+            return None
+        rank = q * self._count
+        seen = 0
+        for i, c in enumerate(self._counts):
+            seen += c
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else "+Inf"
+        return "+Inf"
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "count": self._count,
+                "sum": round(self._sum, 6),
+                "mean": round(self._sum / self._count, 6) if self._count else None,
+                "p50": self._quantile(0.5),
+                "p99": self._quantile(0.99),
+                "buckets": {
+                    **{f"le_{b}": c for b, c in zip(self.buckets, self._counts)},
+                    "le_inf": self._counts[-1],
+                },
+            }
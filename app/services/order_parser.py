@@ -0,0 +1,156 @@
+import re
+import logging
+from typing import List, NamedTuple, Optional, Tuple
+from ..models.database import Restaurant, MenuItem, get_menu_index, find_item_by_speech
+from .spoken_numbers import cardinal_groups, number_runs, quantity_value, rank_ids
+
+logger = logging.getLogger(__name__)
+
+MAX_QUANTITY = 20
+
+# Lead-ins before the first dish: "I'd like ...", "can I get ...", "let me have ..."
+PREAMBLE = {
+    "i", "d", "ll", "we", "want", "like", "would", "can", "could", "may", "get", "have", "will",
+    "let", "me", "us", "give", "gimme", "please", "um", "uh", "so", "ok", "okay", "yes", "yeah",
+    "and", "also", "just", "to", "order", "take", "try", "go", "with",
+}
+
+# "a 41", "an order of 12", "another 20"
+ARTICLES = {"a", "an", "another"}
+# Words between a count and the dish: "two orders of 25", "three number 12", "2 x 30"
+LINKERS = {"of", "order", "orders", "x", "times", "number", "item", "dish", "the"}
+# Words that mark the start of another dish after "and": a count, an article or a dish number
+_STARTERS = ARTICLES | {"number", "item"}
+
+_AND_RE = re.compile(r"\s+(?:and|&)\s+")
+_HARD_SPLIT_RE = re.compile(r"\s*(?:,|;|\bplus\b|\balso\b|\bthen\b)\s*")
+_WORD_RE = re.compile(r"[a-z]+|\d+")
+
+class ParsedLine(NamedTuple):
+    item: MenuItem
+    quantity: int
+    choices: Tuple[int, ...] = ()   # per option, -1 where the caller did not name one
+
+def choice_words(text: str) -> List[str]:
+    """Lowercase words with any plural "s" dropped, so "rice noodle" and "Rice Noodles" compare equal."""
+    return [w[:-1] if len(w) > 3 and w.endswith("s") and not w.endswith("ss") else w for w in _WORD_RE.findall(text.lower())]
+
+def _find(words: List[str], used: List[bool], phrase: List[str]) -> bool:
+    n = len(phrase)
+    for i in range(len(words) - n + 1):
+        if words[i:i + n] == phrase and not any(used[i:i + n]):
+            used[i:i + n] = [True] * n
+            return True
+    return False
+
+def option_words(segment: str, item: MenuItem) -> List[str]:
+    """
+    The words of a dish phrase that can name its options: those after "with", else those that are
+    not in the dish name, so "spicy beef noodles" does not choose Beef. A choice spoken whole that
+    reaches past the name ("rice noodles" for ShanXi Shaved Noodles) is kept.
+    """
+    _, sep, tail = segment.lower().partition(" with ")
+    if sep:
+        return choice_words(tail)
+    words = choice_words(segment)
+    name = set(choice_words(item.name))
+    keep = [w not in name for w in words]
+    for opt in item.options:
+        for choice in opt.choices:
+            phrase = choice_words(choice.name)
+            n = len(phrase)
+            if all(w in name for w in phrase):
+                continue
+            for i in range(len(words) - n + 1):
+                if words[i:i + n] == phrase:
+                    keep[i:i + n] = [True] * n
+    return [w for w, k in zip(words, keep) if k]
+
+def match_choices(item: MenuItem, words: List[str]) -> List[int]:
+    """
+    Choice index per option of the item named in the words ("wide", "beef", "variety 2"), -1 where
+    none or more than one was. Longer names are tried first, so "diet coke" is not read as "coke".
+    """
+    used = [False] * len(words)
+    choices = []
+    for opt in item.options:
+        option = choice_words(opt.name)
+        found = set()
+        for idx, choice in sorted(enumerate(opt.choices), key=lambda ic: -len(ic[1].name)):
+            if _find(words, used, choice_words(choice.name)) or _find(words, used, option + [choice.id]):
+                found.add(idx)
+        choices.append(found.pop() if len(found) == 1 else -1)
+    return choices
+
+def split_segments(text: str) -> List[str]:
+    """
+    Splits "two number 20 and a 41, plus 12" into one phrase per dish. "and" only splits when the
+    next phrase starts like a new dish, so names like "Rock Sugar and Pear" stay whole.
+    """
+    segments = []
+    for part in _HARD_SPLIT_RE.split(text.lower()):
+        pieces = _AND_RE.split(part)
+        current = pieces[0]
+        for piece in pieces[1:]:
+            words = _WORD_RE.findall(piece)
+            if words and (words[0] in _STARTERS or quantity_value(words[0]) is not None):
+                segments.append(current)
+                current = piece
+            else:
+                current = f"{current} and {piece}"
+        segments.append(current)
+    return [s for s in (seg.strip() for seg in segments) if s]
+
+def parse_segment(segment: str, restaurant: Restaurant) -> Optional[ParsedLine]:
+    # The dish is named before any "with ..." (its options)
+    words = _WORD_RE.findall(segment.partition(" with ")[0])
+    while words and words[0] in PREAMBLE:
+        words = words[1:]
+
+    if words and words[0] in ARTICLES:
+        return _parse_dish(segment, words[1:], 1, restaurant)
+    if len(words) >= 2 and quantity_value(words[1]) is None:
+        # "two beef noodle soups", "3 orders of 25": a count followed by a word,
+        # unless nothing after it names a dish ("10 pan fried" is dish 10)
+        count = quantity_value(words[0])
+        if count is not None and 1 <= count <= MAX_QUANTITY:
+            line = _parse_dish(segment, words[1:], count, restaurant)
+            if line:
+                return line
+    return _parse_dish(segment, words, None, restaurant)
+
+def _parse_dish(segment: str, words: List[str], quantity: Optional[int], restaurant: Restaurant) -> Optional[ParsedLine]:
+    valid = get_menu_index(restaurant).by_id
+    while words and words[0] in LINKERS:
+        words = words[1:]
+    if not words:
+        return None
+    rest = " ".join(words)
+
+    item = None
+    if quantity is None:
+        # "two 20": a count run straight into the dish number, when the whole run is not itself an ID
+        runs = number_runs(rest)
+        if runs:
+            groups = cardinal_groups(runs[0])
+            head, tail = str(groups[0]), "".join(str(g) for g in groups[1:])
+            if len(groups) >= 2 and 1 <= groups[0] <= MAX_QUANTITY and head + tail not in valid and tail in valid:
+                item, quantity = valid[tail], groups[0]
+
+    if item is None:
+        candidates = rank_ids(rest, valid)
+        item = valid[candidates[0].digits] if candidates else find_item_by_speech(rest, restaurant)
+        if item is None:
+            return None
+    return ParsedLine(item, quantity or 1, tuple(match_choices(item, option_words(segment, item))))
+
+def parse_order(text: str, restaurant: Restaurant) -> List[ParsedLine]:
+    """Every dish named in the utterance, with quantities, in the order they were said."""
+    lines = []
+    for segment in split_segments(text):
+        line = parse_segment(segment, restaurant)
+        if line:
+            lines.append(line)
+        else:
+            logger.info(f"[parse_order] No dish in '{segment}'")
+    return lines
@@ -0,0 +1,384 @@
+import os
+import sys
+import glob
+import json
+import time
+import queue
+import base64
+import sqlite3
+import logging
+import datetime
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class OrderSink(ABC):
+    """Where confirmed orders go. submit() must be cheap: it runs inside the confirm webhook."""
+    @abstractmethod
+    def submit(self, order: Dict[str, Any]):
+        pass
+
+    @abstractmethod
+    def write_batch(self, orders: List[Dict[str, Any]]):
+        """Durably writes orders right away (used by the background writer and the importer)."""
+        pass
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        return True
+
+    def close(self):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": type(self).__name__}
+
+    def get(self, call_sid: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError(f"{type(self).__name__} does not support queries (use ORDER_STORE=sqlite)")
+
+    def query(self, restaurant_id: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None,
+              cursor: Optional[str] = None, limit: int = 50) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """One page of orders, newest first. Returns (orders, next_cursor); next_cursor is None on the last page."""
+        raise NotImplementedError(f"{type(self).__name__} does not support queries (use ORDER_STORE=sqlite)")
+
+    def stream(self, restaurant_id: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None) -> Iterator[str]:
+        """Every matching order as a JSON string, newest first."""
+        raise NotImplementedError(f"{type(self).__name__} does not support queries (use ORDER_STORE=sqlite)")
+
+    def read_since(self, position: int, limit: int = 10000) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Orders written after `position`, in write order, for consumers that tail the store.
+        Returns (orders, new_position); start from 0.
+        """
+        raise NotImplementedError(f"{type(self).__name__} cannot be tailed (use ORDER_STORE=sqlite or log)")
+
+def encode_cursor(created_at: float, call_sid: str) -> str:
+    return base64.urlsafe_b64encode(f"{created_at!r}|{call_sid}".encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    try:
+        created_at, call_sid = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return float(created_at), call_sid
+    except Exception as e:
+        raise ValueError("invalid cursor") from e
+
+class JSONFileOrderSink(OrderSink):
+    """Legacy layout: one pretty-printed file per order, written synchronously."""
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def submit(self, order: Dict[str, Any]):
+        self.write_batch([order])
+
+    def write_batch(self, orders: List[Dict[str, Any]]):
+        for order in orders:
+            stamp = datetime.datetime.fromisoformat(order["timestamp"]).strftime("%Y%m%d_%H%M%S")
+            filename = os.path.join(self.directory, f"order_{stamp}_{order['call_sid']}.json")
+            with open(filename, "w") as f:
+                json.dump(order, f, indent=4)
+
+class BatchedOrderSink(OrderSink):
+    """
+    Queues orders and writes them from one background thread with group commit: whatever has
+    arrived by the time the previous batch is durable goes out together, behind a single fsync.
+    """
+    def __init__(self):
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        self._pending = 0
+        self._cond = threading.Condition()
+        self.batches = 0
+        self.written = 0
+        self.failed = 0
+        self._thread = threading.Thread(target=self._run, name=f"{type(self).__name__}-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, order: Dict[str, Any]):
+        with self._cond:
+            self._pending += 1
+        self._queue.put(order)
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.monotonic() + settings.ORDER_FLUSH_INTERVAL
+            while len(batch) < settings.ORDER_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                try:
+                    order = self._queue.get(timeout=max(0.0, remaining)) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if order is None:
+                    self._queue.put(None)
+                    break
+                batch.append(order)
+            self._commit(batch)
+
+    def _commit(self, batch: List[Dict[str, Any]]):
+        for attempt in range(3):
+            try:
+                self.write_batch(batch)
+                self.batches += 1
+                self.written += len(batch)
+                break
+            except Exception as e:
+                logger.error(f"Order batch write failed (attempt {attempt + 1}, {len(batch)} orders): {e}")
+                time.sleep(0.1 * (2 ** attempt))
+        else:
+            self.failed += len(batch)
+            for order in batch:
+                logger.critical(f"ORDER NOT PERSISTED: {json.dumps(order)}")
+        with self._cond:
+            self._pending -= len(batch)
+            self._cond.notify_all()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Waits until every submitted order has been written. Returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending == 0, timeout)
+
+    def close(self):
+        self.flush()
+        self._queue.put(None)
+        self._thread.join(timeout=5.0)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": type(self).__name__, "pending": self._pending, "batches": self.batches, "written": self.written, "failed": self.failed}
+
+class LogOrderSink(BatchedOrderSink):
+    """
+    Append-only JSON-lines log, written by one process. A torn last line from a crash is trimmed on
+    startup, and a batch whose write fails is cut off again before it is retried, so no order is
+    logged twice.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._recover()
+        self._file = open(path, "ab")
+        # Bytes of complete, fsynced batches; readers never look past it
+        self._end = os.path.getsize(path)
+        super().__init__()
+
+    def _recover(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb+") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if size == 0:
+                return
+            # Walk back to the last complete record
+            pos = size
+            while pos > 0:
+                step = min(4096, pos)
+                f.seek(pos - step)
+                chunk = f.read(step)
+                nl = chunk.rfind(b"\n")
+                if nl >= 0:
+                    pos = pos - step + nl + 1
+                    break
+                pos -= step
+            if pos < size:
+                logger.warning(f"Order log {self.path}: dropping {size - pos} bytes of torn record")
+                f.truncate(pos)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def write_batch(self, orders: List[Dict[str, Any]]):
+        data = b"".join(json.dumps(o, separators=(",", ":")).encode() + b"\n" for o in orders)
+        if os.fstat(self._file.fileno()).st_size != self._end:
+            self._rewind()   # an earlier failed batch could not be cut off at the time
+        try:
+            self._file.write(data)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except Exception:
+            self._rewind()
+            raise
+        self._end += len(data)
+
+    def _rewind(self):
+        """Cuts off whatever part of a failed batch reached the file and reopens it."""
+        try:
+            self._file.close()
+        except Exception:
+            pass   # closing flushes the rest of the buffer, which may fail again; it is cut off below
+        try:
+            with open(self.path, "rb+") as f:
+                f.truncate(self._end)
+                f.flush()
+                os.fsync(f.fileno())
+        finally:
+            self._file = open(self.path, "ab")
+
+    def read_since(self, position: int, limit: int = 10000) -> Tuple[List[Dict[str, Any]], int]:
+        # position is a byte offset; only complete lines are consumed
+        orders = []
+        end = self._end
+        with open(self.path, "rb") as f:
+            f.seek(position)
+            while len(orders) < limit and position < end:
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    break
+                position += len(line)
+                orders.append(json.loads(line))
+        return orders, position
+
+    def close(self):
+        super().close()
+        self._file.close()
+
+class SQLiteOrderSink(BatchedOrderSink):
+    """
+    SQLite in WAL mode; each batch is one transaction. call_sid is unique, so re-imports are no-ops.
+    Queries use keyset pagination over (created_at, call_sid) indexes, so a page costs the same
+    however much history there is. Readers get their own per-thread connections and never block the writer.
+    """
+    STREAM_CHUNK = 1000
+
+    def __init__(self, path: str):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10.0, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS orders ("
+            "call_sid TEXT PRIMARY KEY, order_id TEXT NOT NULL, restaurant_id TEXT NOT NULL, "
+            "created_at REAL NOT NULL, total_cents INTEGER NOT NULL, status TEXT NOT NULL, data TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS orders_restaurant_time ON orders (restaurant_id, created_at, call_sid)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS orders_time ON orders (created_at, call_sid)")
+        self._conn.commit()
+        super().__init__()
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    def _select(self, restaurant_id: Optional[str], since: Optional[float], until: Optional[float],
+                after: Optional[Tuple[float, str]], limit: int) -> List[Tuple[float, str, str]]:
+        clauses, params = [], []
+        if restaurant_id is not None:
+            clauses.append("restaurant_id = ?")
+            params.append(restaurant_id)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+        if after is not None:
+            clauses.append("(created_at, call_sid) < (?, ?)")
+            params.extend(after)
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+        sql = f"SELECT created_at, call_sid, data FROM orders {where}ORDER BY created_at DESC, call_sid DESC LIMIT ?"
+        return self._reader().execute(sql, (*params, limit)).fetchall()
+
+    def get(self, call_sid: str) -> Optional[Dict[str, Any]]:
+        row = self._reader().execute("SELECT data FROM orders WHERE call_sid = ?", (call_sid,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def query(self, restaurant_id: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None,
+              cursor: Optional[str] = None, limit: int = 50) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        after = decode_cursor(cursor) if cursor else None
+        # Fetch one extra row to know whether there is a next page
+        rows = self._select(restaurant_id, since, until, after, limit + 1)
+        next_cursor = encode_cursor(*rows[limit - 1][:2]) if len(rows) > limit else None
+        return [json.loads(r[2]) for r in rows[:limit]], next_cursor
+
+    def read_since(self, position: int, limit: int = 10000) -> Tuple[List[Dict[str, Any]], int]:
+        # position is a rowid; INSERT OR IGNORE never reuses one
+        rows = self._reader().execute(
+            "SELECT rowid, data FROM orders WHERE rowid > ? ORDER BY rowid LIMIT ?", (position, limit)
+        ).fetchall()
+        return [json.loads(r[1]) for r in rows], (rows[-1][0] if rows else position)
+
+    def stream(self, restaurant_id: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None) -> Iterator[str]:
+        after = None
+        while True:
+            rows = self._select(restaurant_id, since, until, after, self.STREAM_CHUNK)
+            for row in rows:
+                yield row[2]
+            if len(rows) < self.STREAM_CHUNK:
+                return
+            after = rows[-1][:2]
+
+    def write_batch(self, orders: List[Dict[str, Any]]):
+        rows = [
+            (
+                o["call_sid"],
+                o["order_id"],
+                o.get("restaurant_id", ""),
+                datetime.datetime.fromisoformat(o["timestamp"]).timestamp(),
+                int(round(o.get("total_price", 0) * 100)),
+                o.get("status", ""),
+                json.dumps(o, separators=(",", ":")),
+            )
+            for o in orders
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR IGNORE INTO orders VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def close(self):
+        super().close()
+        self._conn.close()
+
+def create_order_sink() -> OrderSink:
+    backend = settings.ORDER_STORE.lower()
+
+    if backend == "json":
+        return JSONFileOrderSink(settings.ORDER_DIR)
+    elif backend == "log":
+        path = os.path.join(settings.ORDER_DIR, "orders.log")
+        logger.info(f"Order store: append-only log ({path})")
+        return LogOrderSink(path)
+    else:
+        path = os.path.join(settings.ORDER_DIR, "orders.db")
+        logger.info(f"Order store: SQLite ({path})")
+        return SQLiteOrderSink(path)
+
+def import_json_orders(sink: OrderSink, directory: str) -> int:
+    """One-shot import of legacy orders/order_*.json files into the given sink."""
+    from ..models.database import restaurants_db
+    ids_by_name = {r.name: r.id for r in restaurants_db}
+
+    orders = []
+    for path in sorted(glob.glob(os.path.join(directory, "order_*.json"))):
+        try:
+            with open(path) as f:
+                order = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Skipping unreadable order file {path}: {e}")
+            continue
+        order.setdefault("restaurant_id", ids_by_name.get(order.get("restaurant"), ""))
+        orders.append(order)
+
+    for i in range(0, len(orders), settings.ORDER_BATCH_SIZE):
+        sink.write_batch(orders[i:i + settings.ORDER_BATCH_SIZE])
+    return len(orders)
+
+if __name__ == "__main__":
+    # python -m app.services.order_store import [orders_dir]
+    if len(sys.argv) < 2 or sys.argv[1] != "import":
+        print("Usage: python -m app.services.order_store import [orders_dir]")
+        sys.exit(1)
+    source = sys.argv[2] if len(sys.argv) > 2 else settings.ORDER_DIR
+    target = create_order_sink()
+    count = import_json_orders(target, source)
+    target.close()
+    print(f"Imported {count} orders from {source} into {settings.ORDER_STORE} (orders already present are skipped by sqlite).")
@@ -0,0 +1,260 @@
+import os
+import time
+import heapq
+import sqlite3
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple, Type
+from pydantic import BaseModel
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class SessionStore(ABC):
+    """
+    Where FlowManager keeps per-call state between webhooks.
+    External backends let any worker process (or node) pick up any call.
+    """
+    def __init__(self, model: Type[BaseModel]):
+        self.model = model
+
+    def serialize(self, ctx: BaseModel) -> str:
+        return ctx.model_dump_json(exclude_defaults=True)
+
+    def deserialize(self, data) -> BaseModel:
+        return self.model.model_validate_json(data)
+
+    @abstractmethod
+    def get(self, call_sid: str) -> Optional[BaseModel]:
+        pass
+
+    @staticmethod
+    def ttl_for(terminal: bool) -> float:
+        """Idle calls live SESSION_TTL; finished calls only linger briefly for stray callbacks."""
+        return settings.SESSION_TERMINAL_TTL if terminal else settings.SESSION_TTL
+
+    @abstractmethod
+    def save(self, ctx: BaseModel, terminal: bool = False):
+        pass
+
+    @abstractmethod
+    def delete(self, call_sid: str):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": type(self).__name__}
+
+class MemorySessionStore(SessionStore):
+    """
+    Process-local dict. Only correct with a single worker process.
+    Bounded in two ways: entries expire (idle TTL, shorter once the call has finished) and are
+    reaped from a min-heap of deadlines; past SESSION_MAX_LIVE the least recently used call is dropped.
+    """
+    def __init__(self, model: Type[BaseModel], max_sessions: Optional[int] = None):
+        super().__init__(model)
+        self.max_sessions = max_sessions if max_sessions is not None else settings.SESSION_MAX_LIVE
+        self.sessions: "OrderedDict[str, BaseModel]" = OrderedDict()
+        self._deadlines: Dict[str, Tuple[float, bool]] = {}
+        self._heap: List[Tuple[float, str]] = []
+        self._next_reap = 0.0
+        self._lock = threading.Lock()
+        self.evictions = {"idle": 0, "terminal": 0, "capacity": 0}
+
+    def get(self, call_sid: str) -> Optional[BaseModel]:
+        now = time.monotonic()
+        with self._lock:
+            self._maybe_reap(now)
+            ctx = self.sessions.get(call_sid)
+            if ctx is None:
+                return None
+            deadline, terminal = self._deadlines[call_sid]
+            if deadline <= now:
+                self._evict(call_sid, "terminal" if terminal else "idle")
+                return None
+            self.sessions.move_to_end(call_sid)
+            return ctx
+
+    def save(self, ctx: BaseModel, terminal: bool = False):
+        now = time.monotonic()
+        deadline = now + self.ttl_for(terminal)
+        with self._lock:
+            self.sessions[ctx.call_sid] = ctx
+            self.sessions.move_to_end(ctx.call_sid)
+            self._deadlines[ctx.call_sid] = (deadline, terminal)
+            heapq.heappush(self._heap, (deadline, ctx.call_sid))
+            while len(self.sessions) > self.max_sessions:
+                oldest = next(iter(self.sessions))
+                self._evict(oldest, "capacity")
+            self._maybe_reap(now)
+
+    def delete(self, call_sid: str):
+        with self._lock:
+            self.sessions.pop(call_sid, None)
+            self._deadlines.pop(call_sid, None)
+
+    def _evict(self, call_sid: str, reason: str):
+        del self.sessions[call_sid]
+        del self._deadlines[call_sid]
+        self.evictions[reason] += 1
+
+    def _maybe_reap(self, now: float):
+        if now < self._next_reap:
+            return
+        self._next_reap = now + settings.SESSION_REAP_INTERVAL
+        self._reap(now)
+
+    def reap(self) -> int:
+        """Drops every session whose deadline has passed. Returns how many were dropped."""
+        with self._lock:
+            return self._reap(time.monotonic())
+
+    def _reap(self, now: float) -> int:
+        reaped = 0
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            deadline, call_sid = heapq.heappop(heap)
+            current = self._deadlines.get(call_sid)
+            # Heap entries go stale whenever a call is saved again; only the latest deadline counts
+            if current and current[0] == deadline:
+                self._evict(call_sid, "terminal" if current[1] else "idle")
+                reaped += 1
+        if len(heap) > 4 * len(self._deadlines) + 1024:
+            self._heap = [(d, sid) for sid, (d, _) in self._deadlines.items()]
+            heapq.heapify(self._heap)
+        return reaped
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": type(self).__name__,
+                "live_sessions": len(self.sessions),
+                "max_sessions": self.max_sessions,
+                "evictions": dict(self.evictions),
+            }
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+class SQLiteSessionStore(SessionStore):
+    """SQLite in WAL mode; shared by all workers on one host."""
+    def __init__(self, model: Type[BaseModel], path: str):
+        super().__init__(model)
+        self.path = path
+        self._local = threading.local()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "call_sid TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)")
+        self._next_reap = 0.0
+        self.reaped = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread: webhooks run in a threadpool
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, call_sid: str) -> Optional[BaseModel]:
+        row = self._conn().execute(
+            "SELECT data FROM sessions WHERE call_sid = ? AND expires_at > ?", (call_sid, time.time())
+        ).fetchone()
+        return self.deserialize(row[0]) if row else None
+
+    def save(self, ctx: BaseModel, terminal: bool = False):
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO sessions (call_sid, data, updated_at, expires_at) VALUES (?, ?, ?, ?)",
+            (ctx.call_sid, self.serialize(ctx), now, now + self.ttl_for(terminal)),
+        )
+        if now >= self._next_reap:
+            self._next_reap = now + settings.SESSION_REAP_INTERVAL
+            self.reap(now)
+
+    def delete(self, call_sid: str):
+        self._conn().execute("DELETE FROM sessions WHERE call_sid = ?", (call_sid,))
+
+    def reap(self, now: Optional[float] = None) -> int:
+        cur = self._conn().execute("DELETE FROM sessions WHERE expires_at <= ?", (now or time.time(),))
+        self.reaped += cur.rowcount
+        return cur.rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        live = self._conn().execute("SELECT COUNT(*) FROM sessions WHERE expires_at > ?", (time.time(),)).fetchone()[0]
+        return {"backend": type(self).__name__, "live_sessions": live, "evictions": {"expired": self.reaped}}
+
+class RedisSessionStore(SessionStore):
+    """
+    Any Redis-protocol server (Redis, Valkey, KeyDB, ...); shared by all workers and nodes.
+    Redis expires the session keys itself. A sorted set of call SID -> expiry time is kept next to
+    them, so the live count is one ZCARD and expirations can be counted per store.
+    """
+    KEY_PREFIX = "callcenter:session:"
+    LIVE_KEY = "callcenter:sessions:live"
+    EXPIRED_KEY = "callcenter:sessions:expired"
+
+    def __init__(self, model: Type[BaseModel], url: str):
+        super().__init__(model)
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("SESSION_STORE=redis requires the 'redis' package (pip install redis)") from e
+        self.client = redis.Redis.from_url(url)
+        self._next_reap = 0.0
+
+    def get(self, call_sid: str) -> Optional[BaseModel]:
+        data = self.client.get(self.KEY_PREFIX + call_sid)
+        return self.deserialize(data) if data else None
+
+    def save(self, ctx: BaseModel, terminal: bool = False):
+        now = time.time()
+        ttl = max(1, int(self.ttl_for(terminal)))
+        pipe = self.client.pipeline()
+        pipe.set(self.KEY_PREFIX + ctx.call_sid, self.serialize(ctx), ex=ttl)
+        pipe.zadd(self.LIVE_KEY, {ctx.call_sid: now + ttl})
+        pipe.execute()
+        if now >= self._next_reap:
+            self._next_reap = now + settings.SESSION_REAP_INTERVAL
+            self.reap(now)
+
+    def delete(self, call_sid: str):
+        pipe = self.client.pipeline()
+        pipe.delete(self.KEY_PREFIX + call_sid)
+        pipe.zrem(self.LIVE_KEY, call_sid)
+        pipe.execute()
+
+    def reap(self, now: Optional[float] = None) -> int:
+        """Drops expired calls from the live set; the keys themselves are already gone."""
+        reaped = self.client.zremrangebyscore(self.LIVE_KEY, "-inf", now or time.time())
+        if reaped:
+            self.client.incrby(self.EXPIRED_KEY, reaped)
+        return reaped
+
+    def stats(self) -> Dict[str, Any]:
+        self.reap()
+        pipe = self.client.pipeline()
+        pipe.zcard(self.LIVE_KEY)
+        pipe.get(self.EXPIRED_KEY)
+        live, expired = pipe.execute()
+        return {"backend": type(self).__name__, "live_sessions": live, "evictions": {"expired": int(expired or 0)}}
+
+def create_session_store(model: Type[BaseModel]) -> SessionStore:
+    backend = settings.SESSION_STORE.lower()
+
+    if backend == "sqlite":
+        logger.info(f"Session store: SQLite ({settings.SESSION_SQLITE_PATH})")
+        return SQLiteSessionStore(model, settings.SESSION_SQLITE_PATH)
+    elif backend == "redis":
+        logger.info(f"Session store: Redis ({settings.REDIS_URL})")
+        return RedisSessionStore(model, settings.REDIS_URL)
+    else:
+        return MemorySessionStore(model)
@@ -0,0 +1,181 @@
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+# Kinds of number token
+DIGIT = "digit"       # zero..nine, single numerals
+TEEN = "teen"         # ten..nineteen
+TENS = "tens"         # twenty..ninety
+HUNDRED = "hundred"
+NUMERAL = "numeral"   # multi-digit numerals as written by the STT ("42")
+
+class NumberToken(NamedTuple):
+    kind: str
+    value: int
+    text: str    # digit string this token contributes when read digit by digit
+    weak: bool   # homophone ("for", "to", "ate", "oh"): only a number next to a real one
+
+_UNITS = ["zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine"]
+_TEENS = ["ten", "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen", "seventeen", "eighteen", "nineteen"]
+_TENS = ["twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety"]
+
+# Common phone-line STT confusions for digit words
+HOMOPHONES = {
+    "oh": 0, "o": 0, "won": 1, "to": 2, "too": 2, "tu": 2, "tree": 3, "for": 4, "fore": 4,
+    "sicks": 6, "ate": 8, "nein": 9,
+}
+MISSPELLINGS = {"fourty": 40, "ninty": 90, "nineth": 9}
+
+def _build_lexicon() -> Dict[str, NumberToken]:
+    lexicon: Dict[str, NumberToken] = {}
+    for value, word in enumerate(_UNITS):
+        lexicon[word] = NumberToken(DIGIT, value, str(value), False)
+    for offset, word in enumerate(_TEENS):
+        lexicon[word] = NumberToken(TEEN, 10 + offset, str(10 + offset), False)
+    for offset, word in enumerate(_TENS):
+        lexicon[word] = NumberToken(TENS, 20 + 10 * offset, str(20 + 10 * offset), False)
+    for word, value in MISSPELLINGS.items():
+        kind = TENS if value >= 20 else DIGIT
+        lexicon[word] = NumberToken(kind, value, str(value), False)
+    for word, value in HOMOPHONES.items():
+        lexicon[word] = NumberToken(DIGIT, value, str(value), True)
+    lexicon["hundred"] = NumberToken(HUNDRED, 100, "", False)
+    return lexicon
+
+LEXICON = _build_lexicon()
+
+# Repeat markers: "double four" -> 44
+REPEATS = {"double": 2, "triple": 3}
+
+# Words that may sit inside a spoken number without ending it ("one hundred and five")
+INNER_FILLER = {"and", "uh", "um"}
+
+_TOKEN_RE = re.compile(r"[a-z]+|\d+")
+
+class Reading(NamedTuple):
+    digits: str
+    score: float
+
+def _lookup(token: str) -> Optional[NumberToken]:
+    if token.isdigit():
+        if len(token) == 1:
+            return NumberToken(DIGIT, int(token), token, False)
+        return NumberToken(NUMERAL, int(token), token, False)
+    return LEXICON.get(token)
+
+def quantity_value(token: str) -> Optional[int]:
+    """Value of a single word or numeral used as a count ("two", "3"); homophones never count."""
+    number = _lookup(token)
+    if number is None or number.weak or number.kind == HUNDRED:
+        return None
+    return number.value
+
+def number_runs(text: str) -> List[List[NumberToken]]:
+    """Splits an utterance into maximal runs of number tokens (hyphens and spaces both separate)."""
+    runs: List[List[NumberToken]] = []
+    run: List[NumberToken] = []
+    repeat = 1
+    other_words = 0
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token in REPEATS:
+            repeat = REPEATS[token]
+            continue
+        number = _lookup(token)
+        if number is not None:
+            run.extend([number] * repeat)
+        elif token in INNER_FILLER and run:
+            pass
+        else:
+            other_words += 1
+            if run:
+                runs.append(run)
+                run = []
+        repeat = 1
+    if run:
+        runs.append(run)
+    if not other_words:
+        # Nothing but number-like words ("for to"): take the homophones at face value
+        return runs
+
+    # Homophones only count next to a real number or each other: "I'd like to order 42" must not
+    # read "to" as 2, but "number for ate" is 48
+    cleaned = []
+    for run in runs:
+        if len(run) >= 2 and all(t.weak for t in run):
+            cleaned.append(run)
+            continue
+        while run and run[0].weak:
+            if len(run) > 1 and not run[1].weak:
+                break
+            run = run[1:]
+        while run and run[-1].weak:
+            if len(run) > 1 and not run[-2].weak:
+                break
+            run = run[:-1]
+        if run and not all(t.weak for t in run):
+            cleaned.append(run)
+    return cleaned
+
+def cardinal_groups(run: List[NumberToken]) -> List[int]:
+    """
+    Groups a run the way people say numbers: "forty two" -> [42], "one hundred five" -> [105],
+    "four two" -> [4, 2], "one twenty" -> [1, 20].
+    """
+    groups: List[int] = []
+    current: Optional[int] = None
+    last = ""
+    for token in run:
+        if token.kind == HUNDRED:
+            if current is not None and current < 10:
+                current *= 100
+            else:
+                if current is not None:
+                    groups.append(current)
+                current = 100
+        elif current is None:
+            current = token.value
+        elif last == HUNDRED and token.kind != NUMERAL and token.value < 100:
+            current += token.value
+        elif last == TENS and token.kind == DIGIT and 0 < token.value and current % 10 == 0:
+            current += token.value
+        else:
+            groups.append(current)
+            current = token.value
+        last = token.kind
+    if current is not None:
+        groups.append(current)
+    return groups
+
+def readings(text: str) -> List[Reading]:
+    """Every plausible number in the utterance, most likely first (not checked against any menu)."""
+    scored: Dict[str, float] = {}
+
+    def add(digits: str, score: float):
+        if digits and score > scored.get(digits, 0.0):
+            scored[digits] = score
+
+    all_digits = []
+    for position, run in enumerate(number_runs(text)):
+        penalty = 0.9 if any(t.weak for t in run) else 1.0
+        penalty -= 0.01 * position  # earlier numbers first
+        groups = cardinal_groups(run)
+        if len(groups) == 1:
+            add(str(groups[0]), 1.0 * penalty)
+        else:
+            # "four two" / "one twenty" said digit by digit (or in mixed chunks)
+            add("".join(str(g) for g in groups), 0.9 * penalty)
+            for g in groups:
+                add(str(g), 0.7 * penalty)
+        if not any(t.kind == HUNDRED for t in run):
+            add("".join(t.text for t in run), 0.6 * penalty)
+            all_digits.extend(t.text for t in run)
+
+    # What the old lookup always did: the first two digits heard
+    joined = "".join(all_digits)
+    if len(joined) >= 2:
+        add(joined[:2], 0.4)
+    return sorted((Reading(d, s) for d, s in scored.items()), key=lambda r: -r.score)
+
+def rank_ids(text: str, valid_ids: Iterable[str]) -> List[Reading]:
+    """Readings of the utterance that are valid IDs, most likely first."""
+    valid = valid_ids if isinstance(valid_ids, (set, frozenset, dict)) else set(valid_ids)
+    return [r for r in readings(text) if r.digits in valid]
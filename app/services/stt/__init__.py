@@ -1,18 +1,42 @@
-from .base import STTProvider
-from .twilio_stt import TwilioSTTProvider
-from .google_stt import GoogleSTTProvider
-from .azure_stt import AzureSTTProvider
-from .openai_stt import OpenAISTTProvider
+import logging
+from importlib import import_module
+from typing import Dict, Type
+from .base import STTProvider, Transcript
 from ...core.config import settings
 
+logger = logging.getLogger(__name__)
+
+# STT_PROVIDER name -> "module:Class". A provider's module, and the vendor SDK it needs, is only
+# imported when that provider is used. A module path starting with "." is relative to this package.
+PROVIDERS: Dict[str, str] = {
+    "twilio": ".twilio_stt:TwilioSTTProvider",
+    "google": ".google_stt:GoogleSTTProvider",
+    "azure": ".azure_stt:AzureSTTProvider",
+    "openai": ".openai_stt:OpenAISTTProvider",
+}
+
+def register_provider(name: str, target: str):
+    """Adds (or replaces) a provider; target is "package.module:Class"."""
+    PROVIDERS[name.lower()] = target
+
+def load_provider(name: str) -> Type[STTProvider]:
+    module, _, attr = PROVIDERS[name].partition(":")
+    return getattr(import_module(module, __name__), attr)
+
 def get_stt_provider() -> STTProvider:
     provider = settings.STT_PROVIDER.lower()
-    
-    if provider == "google":
-        return GoogleSTTProvider()
-    elif provider == "azure":
-        return AzureSTTProvider()
-    elif provider == "openai":
-        return OpenAISTTProvider()
-    else:
-        return TwilioSTTProvider()
+    if provider not in PROVIDERS:
+        provider = "twilio"
+    try:
+        return load_provider(provider)()
+    except ImportError as e:
+        # A missing SDK should not take the whole app down: calls still work on <Gather>
+        logger.error(f"STT_PROVIDER={provider} is unavailable ({e}); falling back to twilio")
+        return load_provider("twilio")()
+
+def __getattr__(name: str):
+    # Keeps `from app.services.stt import GoogleSTTProvider` working without importing every SDK up front
+    for key, target in PROVIDERS.items():
+        if target.endswith(f":{name}"):
+            return load_provider(key)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,8 +1,8 @@
-import json
-import base64
+import asyncio
 import os
-from typing import Any
-from .base import STTProvider
+from typing import AsyncIterator
+from starlette.concurrency import run_in_threadpool
+from .base import STTProvider, Transcript
 from twilio.twiml.voice_response import VoiceResponse, Connect, Stream
 
 # Azure SDK imports
@@ -10,6 +10,8 @@ import azure.cognitiveservices.speech as speechsdk
 from azure.cognitiveservices.speech.audio import PushAudioInputStream, AudioStreamFormat
 
 class AzureSTTProvider(STTProvider):
+    streaming = True
+
     def get_initial_twiml(self, prompt: str, callback_url: str) -> str:
         response = VoiceResponse()
         response.say(prompt)
@@ -19,40 +21,49 @@ class AzureSTTProvider(STTProvider):
         response.append(connect)
         return str(response)
 
-    async def process_stream(self, websocket: Any, stream_sid: str):
+    async def recognize(self, audio: AsyncIterator[bytes]) -> AsyncIterator[Transcript]:
         # Retrieve keys from env or config
         speech_key = os.getenv("AZURE_SPEECH_KEY")
         service_region = os.getenv("AZURE_SPEECH_REGION")
-        
+
         if not speech_key or not service_region:
-            print("Azure credentials missing.")
-            return
+            raise RuntimeError("Azure credentials missing.")
 
         # Setup Azure Audio Stream
         # Twilio sends mulaw 8000Hz
         format = AudioStreamFormat(samples_per_second=8000, bits_per_sample=8, channels=1, wave_stream_format=speechsdk.AudioStreamWaveFormat.MULAW)
         stream = PushAudioInputStream(stream_format=format)
-        
+
         audio_config = speechsdk.audio.AudioConfig(stream=stream)
         speech_config = speechsdk.SpeechConfig(subscription=speech_key, region=service_region)
         speech_recognizer = speechsdk.SpeechRecognizer(speech_config=speech_config, audio_config=audio_config)
 
-        # Recognizing callback
-        def recognized_cb(evt):
-            print('Azure STT Final: {}'.format(evt.result.text))
-            # Here you would typically trigger some event or state update logic
+        # The SDK calls back on its own threads; hand results to this coroutine through a queue
+        loop = asyncio.get_running_loop()
+        results: asyncio.Queue = asyncio.Queue()
+
+        def emit(item):
+            loop.call_soon_threadsafe(results.put_nowait, item)
 
-        speech_recognizer.recognized.connect(recognized_cb)
-        speech_recognizer.start_continuous_recognition()
+        speech_recognizer.recognizing.connect(lambda evt: emit(Transcript(evt.result.text, False)))
+        speech_recognizer.recognized.connect(lambda evt: emit(Transcript(evt.result.text, True)))
+        speech_recognizer.session_stopped.connect(lambda evt: emit(None))
+        speech_recognizer.canceled.connect(lambda evt: emit(None))
+        # Starting and stopping wait on the service; the SDK futures are resolved off the event loop
+        await run_in_threadpool(lambda: speech_recognizer.start_continuous_recognition_async().get())
 
+        async def pump():
+            async for chunk in audio:
+                stream.write(chunk)
+            stream.close()
+
+        feeder = asyncio.create_task(pump())
         try:
-            async for message in websocket.iter_text():
-                data = json.loads(message)
-                if data['event'] == 'media':
-                    audio_chunk = base64.b64decode(data['media']['payload'])
-                    stream.write(audio_chunk)
-                elif data['event'] == 'stop':
+            while True:
+                item = await results.get()
+                if item is None:
                     break
+                yield item
         finally:
-            stream.close()
-            speech_recognizer.stop_continuous_recognition()
+            feeder.cancel()
+            await run_in_threadpool(lambda: speech_recognizer.stop_continuous_recognition_async().get())
@@ -1,7 +1,14 @@
 from abc import ABC, abstractmethod
-from typing import Any, AsyncGenerator
+from typing import Any, AsyncIterator, NamedTuple
+
+class Transcript(NamedTuple):
+    text: str
+    is_final: bool   # False for interim results, which later results of the same utterance replace
 
 class STTProvider(ABC):
+    # True if recognize() works, i.e. calls can run on a Twilio Media Stream instead of <Gather>
+    streaming: bool = False
+
     @abstractmethod
     def get_initial_twiml(self, prompt: str, callback_url: str) -> str:
         """
@@ -11,10 +18,10 @@ class STTProvider(ABC):
         """
         pass
 
-    @abstractmethod
-    async def process_stream(self, websocket: Any, stream_sid: str):
+    async def recognize(self, audio: AsyncIterator[bytes]) -> AsyncIterator[Transcript]:
         """
-        Handles the WebSocket stream for audio processing (for Google/Azure).
-        No-op for Twilio built-in.
+        Transcribes a live call: 8 kHz μ-law chunks in, interim and final transcripts out, until the
+        audio iterator ends. Only providers with streaming = True implement it.
         """
-        pass
+        raise NotImplementedError(f"{type(self).__name__} does not transcribe media streams")
+        yield  # pragma: no cover  (makes this an async generator)
@@ -1,14 +1,8 @@
-from typing import Any
 from .base import STTProvider
 from twilio.twiml.voice_response import VoiceResponse, Connect, Stream
-import os
-import json
-import base64
-from app.core.config import settings
 
-# Note: This implementation assumes usage of OpenAI's Realtime API (Beta) logic 
-# or standard Whisper if we were buffering. 
-# For true bi-directional voice, we mirror the stream structure.
+# Calls with this provider run on <Gather> with recordings transcribed by Whisper (see transcriber.py).
+# A media-stream mode would need a bridge to OpenAI's Realtime API, which recognize() does not have yet.
 
 class OpenAISTTProvider(STTProvider):
     def get_initial_twiml(self, prompt: str, callback_url: str) -> str:
@@ -20,30 +14,3 @@ class OpenAISTTProvider(STTProvider):
         connect.append(stream)
         response.append(connect)
         return str(response)
-
-    async def process_stream(self, websocket: Any, stream_sid: str):
-        # This is a placeholder for the "Realtime API" websocket bridge.
-        # Bridging Twilio <-> OpenAI Realtime requires handling two websocket connections
-        # and translating events. 
-        # Since we are in a single FastAPI process, we would act as the middleware.
-        
-        print("Starting OpenAI Stream processing...")
-        if not settings.OPENAI_API_KEY:
-            print("Error: OPENAI_API_KEY not set")
-            return
-
-        # SIMULATION / MOCK implementation of what the bridge looks like
-        # because the actual OpenAI Realtime client is complex to implement from scratch in one go.
-        # We will log that we are receiving audio.
-        
-        try:
-            async for message in websocket.iter_text():
-                data = json.loads(message)
-                if data['event'] == 'media':
-                    # In a real impl, we forward this payload to OpenAI Realtime WS
-                    # await openai_ws.send(data['media']['payload'])
-                    pass
-                elif data['event'] == 'stop':
-                    break
-        except Exception as e:
-            print(f"Error in OpenAI Stream: {e}")
@@ -1,6 +1,5 @@
 from .base import STTProvider
 from twilio.twiml.voice_response import VoiceResponse, Gather
-from typing import Any
 
 class TwilioSTTProvider(STTProvider):
     def get_initial_twiml(self, prompt: str, callback_url: str) -> str:
@@ -11,7 +10,3 @@ class TwilioSTTProvider(STTProvider):
         # Fallback if no input
         response.say("We didn't receive any input. Goodbye.")
         return str(response)
-
-    async def process_stream(self, websocket: Any, stream_sid: str):
-        # Twilio Built-in STT does not use the WebSocket stream method
-        pass
@@ -1,56 +1,148 @@
+import io
 import os
+import time
+import tempfile
+import asyncio
 import subprocess
-import requests
 import logging
-from openai import OpenAI
+from typing import Optional, BinaryIO, Union
+import aiofiles
+import httpx
 from ..core.config import settings
+from .metrics import Histogram
+from .audio import convert_wav, trim_wav, UnsupportedAudio
 
 logger = logging.getLogger(__name__)
 
+# Statuses worth retrying: 404 while Twilio finishes writing the recording, throttling, upstream errors
+RETRY_STATUSES = {404, 429, 500, 502, 503, 504}
+
 class AudioTranscriber:
     def __init__(self):
         self.api_key = settings.OPENAI_API_KEY
-        if self.api_key:
-            self.client = OpenAI(api_key=self.api_key)
-        else:
-            self.client = None
+        self._client = None
+        if not self.api_key:
             logger.warning("OPENAI_API_KEY not set. Transcription will fail.")
+        self.http = self._build_http_client()
+        self.download_latency = Histogram()
+        self.vad_stats = {"clips": 0, "no_speech": 0, "bytes_in": 0, "bytes_uploaded": 0}
+
+    @property
+    def client(self):
+        """The OpenAI client, created (and the SDK imported) on first use; None without an API key."""
+        if self._client is None and self.api_key:
+            from openai import AsyncOpenAI
+            self._client = AsyncOpenAI(api_key=self.api_key)
+        return self._client
+
+    @staticmethod
+    def _build_http_client() -> httpx.AsyncClient:
+        """One pooled keep-alive client for all recording downloads (HTTP/2 when h2 is installed)."""
+        try:
+            import h2  # noqa: F401
+            http2 = True
+        except ImportError:
+            http2 = False
+        return httpx.AsyncClient(
+            http2=http2,
+            follow_redirects=True,
+            timeout=httpx.Timeout(settings.DOWNLOAD_READ_TIMEOUT, connect=settings.DOWNLOAD_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=settings.DOWNLOAD_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.DOWNLOAD_MAX_CONNECTIONS,
+            ),
+        )
+
+    def _new_buffer(self) -> BinaryIO:
+        """In-memory buffer; spills to a temp file only past AUDIO_SPOOL_MAX_BYTES when that is set."""
+        if settings.AUDIO_SPOOL_MAX_BYTES > 0:
+            return tempfile.SpooledTemporaryFile(max_size=settings.AUDIO_SPOOL_MAX_BYTES)
+        return io.BytesIO()
+
+    async def fetch_audio(self, url: str) -> Optional[BinaryIO]:
+        """
+        Streams a recording into an in-memory buffer, rewound and ready to read.
+        Retries with exponential backoff on 404 (recording not ready yet), 429, 5xx and network errors.
+        """
+        # Twilio URLs usually look like: https://api.twilio.com/2010-04-01/Accounts/{AC...}/Recordings/{RE...}
+        # By default, these require Basic Auth (AccountSid, AuthToken) unless disabled in Twilio Console.
+        auth = None
+        if "twilio.com" in url:
+            auth = (settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
 
-    def download_audio(self, url: str, save_path: str) -> bool:
+        attempts = settings.DOWNLOAD_RETRIES + 1
+        start = time.perf_counter()
+        try:
+            for attempt in range(attempts):
+                retry = attempt + 1 < attempts
+                try:
+                    async with self.http.stream("GET", url, auth=auth) as response:
+                        if response.status_code == 200:
+                            buffer = self._new_buffer()
+                            async for chunk in response.aiter_bytes():
+                                buffer.write(chunk)
+                            size = buffer.tell()
+                            buffer.seek(0)
+                            logger.info(f"Download Status: 200, Content-Type: {response.headers.get('Content-Type')}, Size: {size} bytes, Attempts: {attempt + 1}")
+                            return buffer
+                        body = (await response.aread())[:200]
+                except httpx.TransportError as e:
+                    if not retry:
+                        logger.error(f"Error downloading audio: {e}")
+                        return None
+                    logger.warning(f"Download attempt {attempt + 1} failed: {e}")
+                else:
+                    if not retry or response.status_code not in RETRY_STATUSES:
+                        logger.error(f"Failed to download audio. Status: {response.status_code}, Response: {body!r}")
+                        return None
+                    logger.warning(f"Download attempt {attempt + 1} got {response.status_code}, retrying.")
+                await asyncio.sleep(settings.DOWNLOAD_RETRY_BACKOFF * (2 ** attempt))
+            return None
+        finally:
+            self.download_latency.observe(time.perf_counter() - start)
+
+    async def download_audio(self, url: str, save_path: str) -> bool:
         """Downloads audio from a URL to a local file."""
+        audio = await self.fetch_audio(url)
+        if audio is None:
+            return False
         try:
-            # Twilio URLs usually look like: https://api.twilio.com/2010-04-01/Accounts/{AC...}/Recordings/{RE...}
-            # By default, these require Basic Auth (AccountSid, AuthToken) unless disabled in Twilio Console.
-            
-            auth = None
-            if "twilio.com" in url:
-                from ..core.config import settings
-                auth = (settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
-                logger.info("Detected Twilio URL, using Basic Auth.")
-
-            response = requests.get(url, auth=auth)
-            
-            logger.info(f"Download Status: {response.status_code}, Content-Type: {response.headers.get('Content-Type')}, Size: {len(response.content)} bytes")
-            
-            if response.status_code == 200:
-                with open(save_path, 'wb') as f:
-                    f.write(response.content)
-                return True
-            else:
-                logger.error(f"Failed to download audio. Status: {response.status_code}, Response: {response.text[:200]}")
-                return False
+            async with aiofiles.open(save_path, 'wb') as f:
+                await f.write(audio.read())
+            return True
         except Exception as e:
-            logger.error(f"Error downloading audio: {e}")
+            logger.error(f"Error saving audio: {e}")
             return False
+        finally:
+            audio.close()
+
+    def convert_buffer(self, data: bytes) -> Optional[bytes]:
+        """
+        Converts WAV bytes to 16kHz mono 16-bit WAV bytes in-process (no ffmpeg fork).
+        Returns None for codecs the in-process decoder does not handle.
+        """
+        try:
+            return convert_wav(data)
+        except UnsupportedAudio as e:
+            logger.info(f"In-process conversion unavailable ({e}).")
+            return None
 
     def convert_audio(self, input_path: str, output_path: str) -> bool:
         """
-        Converts audio to 16kHz mono WAV using ffmpeg.
+        Converts audio to 16kHz mono WAV.
+        WAV input (PCM, float, μ-law, A-law) is converted in-process; anything else falls back to
         ffmpeg -i input.wav -ar 16000 -ac 1 output.wav
         """
         if not os.path.exists(input_path):
             return False
-            
+
+        with open(input_path, "rb") as f:
+            converted = self.convert_buffer(f.read())
+        if converted is not None:
+            with open(output_path, "wb") as f:
+                f.write(converted)
+            return True
+
         try:
             command = [
                 "ffmpeg",
@@ -72,26 +164,75 @@ class AudioTranscriber:
             logger.error(f"ffmpeg conversion failed: {e}")
             return False
 
-    def transcribe(self, file_path: str) -> str:
-        """Transcribes the audio file using OpenAI Whisper."""
-        if not self.client:
-            return ""
+    def trim_silence(self, data: bytes) -> Optional[bytes]:
+        """
+        Cuts leading and trailing silence off a WAV recording; None if it holds no speech at all.
+        Formats the in-process decoder does not handle are passed through untouched.
+        """
+        self.vad_stats["clips"] += 1
+        self.vad_stats["bytes_in"] += len(data)
+        try:
+            trimmed = trim_wav(data, min_dbfs=settings.VAD_MIN_DBFS, min_speech_ms=settings.VAD_MIN_SPEECH_MS, pad_ms=settings.VAD_PAD_MS)
+        except UnsupportedAudio as e:
+            logger.info(f"VAD skipped ({e}).")
+            trimmed = data
+        if trimmed is None:
+            self.vad_stats["no_speech"] += 1
+        else:
+            self.vad_stats["bytes_uploaded"] += len(trimmed)
+        return trimmed
 
-        if not os.path.exists(file_path):
-            logger.error(f"File not found for transcription: {file_path}")
+    async def transcribe(self, audio: Union[str, BinaryIO], filename: str = "recording.wav", model: str = "whisper-1") -> str:
+        """
+        Transcribes audio using OpenAI Whisper (or another OpenAI transcription model).
+        `audio` is a file path or a readable buffer (e.g. from fetch_audio); buffers never touch disk.
+        Returns "" without calling the API when the recording has no speech (VAD_ENABLED).
+        """
+        if not self.client:
             return ""
 
         try:
-            with open(file_path, "rb") as audio_file:
-                transcript = self.client.audio.transcriptions.create(
-                    file=audio_file,
-                    model="whisper-1",
-                    language="en"
-                )
-            return transcript.text
+            if isinstance(audio, str):
+                if not os.path.exists(audio):
+                    logger.error(f"File not found for transcription: {audio}")
+                    return ""
+                async with aiofiles.open(audio, "rb") as audio_file:
+                    content = await audio_file.read()
+                filename = os.path.basename(audio)
+            else:
+                content = audio
+
+            if settings.VAD_ENABLED:
+                data = content if isinstance(content, bytes) else content.read()
+                content = self.trim_silence(data)
+                if content is None:
+                    logger.info("No speech in recording; skipping transcription")
+                    return ""
+            return await self.transcribe_clip(content, filename, model)
         except Exception as e:
             logger.error(f"OpenAI Transcription error: {e}")
             return ""
 
+    async def recording_clip(self, url: str) -> Optional[bytes]:
+        """Downloads a recording and trims it (VAD_ENABLED); b"" if it holds no speech, None if the download failed."""
+        audio = await self.fetch_audio(url)
+        if audio is None:
+            return None
+        with audio:
+            data = audio.read()
+        if not settings.VAD_ENABLED:
+            return data
+        clip = self.trim_silence(data)
+        return b"" if clip is None else clip
+
+    async def transcribe_clip(self, clip: Union[bytes, BinaryIO], filename: str = "recording.wav", model: str = "whisper-1") -> str:
+        """One transcription request for audio already in memory; errors are left to the caller."""
+        transcript = await self.client.audio.transcriptions.create(
+            file=(filename, clip),
+            model=model,
+            language="en"
+        )
+        return transcript.text
+
 # Global instance
 transcriber = AudioTranscriber()
@@ -0,0 +1,128 @@
+import sys
+import logging
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Sequence
+from ..models.database import Restaurant, MenuItem
+from ..core.prompts import Prompts
+
+logger = logging.getLogger(__name__)
+
+# Serializes exactly like twilio's VoiceResponse (ElementTree): attributes sorted by name,
+# "&", "<", ">" escaped in text, plus quotes and CR/LF/TAB in attributes, empty elements as "<Say />".
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8"?>'
+
+class Markup(str):
+    """Text that is already XML-escaped and must not be escaped again."""
+
+def escape_text(text: str) -> Markup:
+    if isinstance(text, Markup):
+        return text
+    if "&" in text:
+        text = text.replace("&", "&amp;")
+    if "<" in text:
+        text = text.replace("<", "&lt;")
+    if ">" in text:
+        text = text.replace(">", "&gt;")
+    return Markup(text)
+
+def escape_attr(text: str) -> str:
+    text = escape_text(text)
+    if '"' in text:
+        text = text.replace('"', "&quot;")
+    if "\r" in text:
+        text = text.replace("\r", "&#13;")
+    if "\n" in text:
+        text = text.replace("\n", "&#10;")
+    if "\t" in text:
+        text = text.replace("\t", "&#09;")
+    return text
+
+def fill(template: str, **values) -> Markup:
+    """str.format for prompts: the template and any string values are escaped, pre-escaped ones are kept."""
+    escaped = {k: escape_text(v) if isinstance(v, str) else v for k, v in values.items()}
+    return Markup(escape_text(template).format(**escaped))
+
+def say(text: str) -> str:
+    text = escape_text(text)
+    return f"<Say>{text}</Say>" if text else "<Say />"
+
+@lru_cache(maxsize=256)
+def _gather_open(action: str, num_digits: int, timeout: int = 0) -> str:
+    # One per (callback URL, digits) pair, so in practice a handful per host
+    if timeout:
+        # Keypad only (speech arrives over the media stream); an empty result is posted as silence
+        return sys.intern(
+            f'<Gather action="{escape_attr(action)}" actionOnEmptyResult="true" input="dtmf" numDigits="{num_digits}" timeout="{timeout}">'
+        )
+    return sys.intern(
+        f'<Gather action="{escape_attr(action)}" input="speech dtmf" numDigits="{num_digits}" speechTimeout="auto">'
+    )
+
+def gather(text: str, action: str, num_digits: int, lead: str = "", timeout: int = 0) -> str:
+    """<Response>[<Say>lead</Say>]<Gather ...><Say>text</Say></Gather></Response>; timeout > 0 gathers keys only."""
+    lead_xml = say(lead) if lead else ""
+    return f"{XML_DECLARATION}<Response>{lead_xml}{_gather_open(action, num_digits, timeout)}{say(text)}</Gather></Response>"
+
+def start_stream(response: str, url: str, parameters: Dict[str, str]) -> str:
+    """Puts <Start><Stream> at the top of a response, forking the caller's audio to url for the rest of the call."""
+    params = "".join(f'<Parameter name="{escape_attr(k)}" value="{escape_attr(v)}" />' for k, v in parameters.items())
+    head = f"{XML_DECLARATION}<Response>"
+    return f'{head}<Start><Stream url="{escape_attr(url)}">{params}</Stream></Start>{response[len(head):]}'
+
+def hangup(text: str) -> str:
+    """<Response><Say>text</Say><Hangup /></Response>"""
+    return f"{XML_DECLARATION}<Response>{say(text)}<Hangup /></Response>"
+
+class ItemPrompts(NamedTuple):
+    """Pre-escaped phrases for one menu item."""
+    name: Markup
+    choices: List[List[Markup]]     # escaped choice names, per option
+    option_prompts: List[Markup]    # what to say when asking for option i
+    confirm: Markup                 # confirmation when there are no options to mention
+    added: Markup
+
+    def describe(self, choices: Sequence[int]) -> Markup:
+        """Returns "Name with Choice, Choice" for the chosen indexes (-1 = not chosen)."""
+        names = [opt[c] for opt, c in zip(self.choices, choices) if c >= 0]
+        return Markup(f"{self.name} with {', '.join(names)}") if names else self.name
+
+    def confirm_with(self, choices: Sequence[int]) -> Markup:
+        if not any(c >= 0 for c in choices):
+            return self.confirm
+        return fill(Prompts.CONFIRM_DISH_TEMPLATE, dish_name=self.describe(choices))
+
+def build_item_prompts(item: MenuItem) -> ItemPrompts:
+    name = escape_text(item.name)
+    option_prompts = []
+    for i, opt in enumerate(item.options):
+        options_list = ", ".join(f"{c.id} for {c.name}" for c in opt.choices)
+        if i == 0:
+            option_prompts.append(fill(Prompts.VARIETY_PROMPT_TEMPLATE, dish_name=name, options_list=options_list))
+        else:
+            option_prompts.append(fill("Next, for {dish_name}, {option}? {options_list}", dish_name=name, option=opt.name, options_list=options_list))
+    return ItemPrompts(
+        name=name,
+        choices=[[escape_text(c.name) for c in opt.choices] for opt in item.options],
+        option_prompts=option_prompts,
+        confirm=fill(Prompts.CONFIRM_DISH_TEMPLATE, dish_name=name),
+        added=fill(Prompts.ADD_MORE, dish_name=name),
+    )
+
+class MenuPrompts:
+    """Every item's prompts, built once per menu."""
+    def __init__(self, menu: List[MenuItem]):
+        self.menu = menu
+        self.items: Dict[str, ItemPrompts] = {item.id: build_item_prompts(item) for item in menu}
+
+    def get(self, item_id: str) -> ItemPrompts:
+        return self.items[item_id]
+
+_menu_prompts: Dict[str, MenuPrompts] = {}
+
+def get_menu_prompts(restaurant: Restaurant) -> MenuPrompts:
+    """Returns the cached prompts for the restaurant, rebuilding them if its menu was replaced."""
+    prompts = _menu_prompts.get(restaurant.id)
+    if prompts is None or prompts.menu is not restaurant.menu:
+        prompts = MenuPrompts(restaurant.menu)
+        _menu_prompts[restaurant.id] = prompts
+    return prompts